@@ -5,6 +5,7 @@ Built with Streamlit for easy, user-friendly meal planning
 Now with Firebase Authentication!
 """
 
+import pandas as pd
 import streamlit as st
 import sys
 from pathlib import Path
@@ -17,32 +18,41 @@ sys.path.insert(0, str(Path(__file__).parent / 'src'))
 from meal_planner import MealPlanner
 from shopping_list import ShoppingListGenerator
 from excel_export import ExcelExporter
+from multi_format_export import _pretty_store
 
 # Import authentication
 from auth import init_session_state, show_auth_page, logout, FirebaseAuth
 from store_manager import StoreManager, show_admin_panel, show_store_selector
 from store_router import apply_smart_routing
-from plan_history import show_plan_selector, show_active_plan_indicator
+from plan_history import show_plan_selector, show_active_plan_indicator, _clear_store_checkbox_state
 
 
 # Inline helper functions (avoiding import issues)
-def _update_checkbox(item_id):
-    """Update checkbox state without blocking UI"""
+def _update_checkbox(changes):
+    """Update checkbox states without blocking UI
+    
+    changes maps item ids to their new checked value.
+    """
+    import json
+    import requests
+    import threading
+    from firebase_config import FIRESTORE_URL
+    
     # Update in session state immediately
-    st.session_state.checklist_state[item_id] = st.session_state[item_id]
+    st.session_state.checklist_state.update(changes)
+    
+    # The thread can't read session state, so capture what it sends now
+    user_id = st.session_state.user['user_id']
+    id_token = st.session_state.user['id_token']
+    state_json = json.dumps(st.session_state.checklist_state)
     
     # Save to Firebase in background (non-blocking)
-    import threading
     def save_async():
         try:
-            from firebase_config import FIRESTORE_URL
-            user_id = st.session_state.user['user_id']
-            id_token = st.session_state.user['id_token']
-            
             url = f"{FIRESTORE_URL}/users/{user_id}/checklist/current"
             headers = {"Authorization": f"Bearer {id_token}"}
             fields = {
-                "state": {"stringValue": json.dumps(st.session_state.checklist_state)},
+                "state": {"stringValue": state_json},
                 "updated_at": {"timestampValue": datetime.now().isoformat() + "Z"}
             }
             requests.patch(url, json={"fields": fields}, headers=headers, timeout=1)
@@ -54,6 +64,44 @@ def _update_checkbox(item_id):
     thread.start()
 
 
+def _store_table(store_name, items):
+    """
+    Item ids and read-only columns of a store's checklist table
+    
+    Built once per list and kept in session state; reruns (every checkbox
+    toggle) reuse it until the store's items change.
+    """
+    signature = tuple((item['item'], item['amount'], item['unit']) for item in items)
+    tables = st.session_state.setdefault('_checklist_tables', {})
+    
+    cached = tables.get(store_name)
+    if cached is None or cached[0] != signature:
+        rows = []
+        for item in items:
+            used_in = item.get('used_in') or []
+            recipes = ", ".join(used_in[:2])
+            if len(used_in) > 2:
+                recipes += f" +{len(used_in)-2}"
+            rows.append({
+                'Qty': f"{item['amount']} {item['unit']}",
+                'Item': item['item'],
+                'Used In': recipes,
+            })
+        item_ids = [f"{store_name}_{idx}" for idx in range(len(items))]
+        cached = (signature, item_ids, pd.DataFrame(rows, columns=['Qty', 'Item', 'Used In']))
+        tables[store_name] = cached
+    return cached[1], cached[2]
+
+
+def _on_store_edit(editor_key, item_ids):
+    """Write a store table's checkbox edits back to the synced checklist"""
+    edited_rows = st.session_state[editor_key]['edited_rows']
+    changes = {item_ids[int(row)]: bool(edit['✓'])
+               for row, edit in edited_rows.items() if '✓' in edit}
+    if changes:
+        _update_checkbox(changes)
+
+
 def display_shopping_with_checklist(shopping_list, auth):
     """Display shopping list with Firebase-synced checkboxes"""
     import json
@@ -88,16 +136,17 @@ def display_shopping_with_checklist(shopping_list, auth):
     
     checklist_state = st.session_state.checklist_state
     
-    # Stats - only count checkboxes for items in CURRENT shopping list
-    total_items = sum(len(store['items']) for store in shopping_list['stores'].values())
-    
-    # Count only items that exist in current list AND are checked
-    checked_items = 0
+    # Stats - only count checkboxes for items in CURRENT shopping list.
+    # One pass builds each store's table and checked column and sums them;
+    # the store loop below reuses the results.
+    store_checks = {}
+    total_items = checked_items = 0
     for store_name, store_data in shopping_list['stores'].items():
-        for idx in range(len(store_data['items'])):
-            item_id = f"{store_name}_{idx}"
-            if checklist_state.get(item_id, False) is True:
-                checked_items += 1
+        item_ids, table = _store_table(store_name, store_data['items'])
+        checked = [checklist_state.get(item_id, False) is True for item_id in item_ids]
+        store_checks[store_name] = (item_ids, table, checked)
+        total_items += len(checked)
+        checked_items += sum(checked)
     
     progress = checked_items / total_items if total_items > 0 else 0
     
@@ -113,6 +162,8 @@ def display_shopping_with_checklist(shopping_list, auth):
     with col4:
         if st.button("🔄 Reset", use_container_width=True):
             st.session_state.checklist_state = {}
+            # Drop table edits too, or the editors would re-apply them
+            _clear_store_checkbox_state()
             try:
                 url = f"{FIRESTORE_URL}/users/{user_id}/checklist/current"
                 headers = {"Authorization": f"Bearer {id_token}"}
@@ -144,7 +195,7 @@ def display_shopping_with_checklist(shopping_list, auth):
             story.append(Spacer(1, 0.3*inch))
             
             for store_name, store_data in shopping_list['stores'].items():
-                story.append(Paragraph(store_name.replace('_', ' ').title(), styles['Heading2']))
+                story.append(Paragraph(_pretty_store(store_name), styles['Heading2']))
                 
                 table_data = [['☐', 'Item', 'Amount']]
                 for idx, item in enumerate(store_data['items']):
@@ -179,12 +230,11 @@ def display_shopping_with_checklist(shopping_list, auth):
     
     # Display by store
     for store_name, store_data in shopping_list['stores'].items():
-        store_display = store_name.replace('_', ' ').title()
+        store_display = _pretty_store(store_name)
         store_items = store_data['items']
         
-        # Count checked items for this store
-        store_checked = sum(1 for idx in range(len(store_items))
-                           if checklist_state.get(f"{store_name}_{idx}", False))
+        item_ids, table, checked = store_checks[store_name]
+        store_checked = sum(checked)
         
         with st.expander(f"**{store_display}** ({store_checked}/{len(store_items)} checked)", 
                         expanded=(store_checked < len(store_items))):
@@ -192,27 +242,21 @@ def display_shopping_with_checklist(shopping_list, auth):
                 st.caption(f"📍 {store_data['store_info'].get('type', '')}")
             st.markdown("")
             
-            for idx, item in enumerate(store_items):
-                item_id = f"{store_name}_{idx}"
-                col1, col2 = st.columns([1, 5])
-                
-                with col1:
-                    # Simplified checkbox - direct binding to session state
-                    checked = st.checkbox("✓", value=checklist_state.get(item_id, False),
-                                        key=item_id, label_visibility="collapsed",
-                                        on_change=lambda iid=item_id: _update_checkbox(iid))
-                
-                with col2:
-                    if checklist_state.get(item_id, False):
-                        st.markdown(f"~~{item['amount']} {item['unit']} **{item['item']}**~~")
-                    else:
-                        st.markdown(f"{item['amount']} {item['unit']} **{item['item']}**")
-                    
-                    if 'used_in' in item and item['used_in']:
-                        recipes = ", ".join(item['used_in'][:2])
-                        if len(item['used_in']) > 2:
-                            recipes += f" +{len(item['used_in'])-2}"
-                        st.caption(f"Used in: {recipes}")
+            # One editable table per store instead of a checkbox widget per item;
+            # its key is registered so plan switches and resets can clear it
+            editor_key = f"editor_{store_name}"
+            st.session_state.setdefault('_store_keys', set()).add(editor_key)
+            st.data_editor(
+                table.assign(**{'✓': checked}),
+                column_config={'✓': st.column_config.CheckboxColumn("✓", width="small")},
+                column_order=['✓', 'Qty', 'Item', 'Used In'],
+                disabled=['Qty', 'Item', 'Used In'],
+                hide_index=True,
+                use_container_width=True,
+                key=editor_key,
+                on_change=_on_store_edit,
+                args=(editor_key, item_ids)
+            )
     
     st.markdown("---")
     st.success("✅ Your progress is automatically saved!")
@@ -221,11 +265,16 @@ def display_shopping_with_checklist(shopping_list, auth):
 def display_recipe_booklet_with_pdf(meal_plan, planner, auth):
     """Display recipe booklet with PDF download"""
     st.header("📖 Recipe Booklet")
-    unique_recipes = set()
-    for day in meal_plan['days']:
-        for meal_type, meal_info in day.get('meals', {}).items():
-            if meal_info and meal_info.get('recipe'):
-                unique_recipes.add(meal_info['recipe'])
+    unique_recipes = {meal_info['recipe']
+                      for day in meal_plan['days']
+                      for meal_info in day.get('meals', {}).values()
+                      if meal_info and meal_info.get('recipe')}
+    
+    # Index recipes by name once (first match wins, as with the old scan)
+    recipe_index = {}
+    for recipes in planner.recipes.values():
+        for r in recipes:
+            recipe_index.setdefault(r['name'], r)
     
     st.markdown(f"### {len(unique_recipes)} Recipes in Your Plan")
     st.markdown(f"**Meal Plan:** {meal_plan['start_date']} to {meal_plan['end_date']}")
@@ -263,14 +312,7 @@ def display_recipe_booklet_with_pdf(meal_plan, planner, auth):
                 
                 # Each recipe
                 for i, recipe_name in enumerate(sorted(unique_recipes), 1):
-                    recipe = None
-                    for category, recipes in planner.recipes.items():
-                        for r in recipes:
-                            if r['name'] == recipe_name:
-                                recipe = r
-                                break
-                        if recipe:
-                            break
+                    recipe = recipe_index.get(recipe_name)
                     
                     if recipe:
                         story.append(Paragraph(f"{i}. {recipe['name']}", recipe_style))
@@ -325,14 +367,7 @@ def display_recipe_booklet_with_pdf(meal_plan, planner, auth):
     
     # In-app viewer
     for i, recipe_name in enumerate(sorted(unique_recipes), 1):
-        recipe = None
-        for category, recipes in planner.recipes.items():
-            for r in recipes:
-                if r['name'] == recipe_name:
-                    recipe = r
-                    break
-            if recipe:
-                break
+        recipe = recipe_index.get(recipe_name)
         
         if recipe:
             with st.expander(f"**{i}. {recipe['name']}** - {recipe.get('cuisine', 'N/A')}", expanded=(i == 1)):
@@ -384,6 +419,7 @@ if 'meal_plan' not in st.session_state:
     st.session_state.meal_plan = None
 if 'selected_meals' not in st.session_state:
     st.session_state.selected_meals = {}
+st.session_state.setdefault('_store_keys', set())  # Checklist checkbox keys
 if 'recipes' not in st.session_state:
     planner = MealPlanner()
     st.session_state.recipes = planner.recipes
@@ -598,12 +634,8 @@ def show_main_app():
                             del st.session_state.shopping_list
                         
                         # Clear all checkbox states
-                        keys_to_delete = [key for key in st.session_state.keys() 
-                                         if any(key.startswith(store) for store in 
-                                               ['costco_', 'whole_foods_', 'petes_fresh_market_', 
-                                                'jewel_', 'aldi_'])]
-                        for key in keys_to_delete:
-                            del st.session_state[key]
+                        for key in st.session_state.pop('_store_keys', set()):
+                            st.session_state.pop(key, None)
                         
                         st.rerun()
                 
@@ -6,9 +6,29 @@ Handles user signup, login, and session management
 import streamlit as st
 import requests
 import json
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Tuple
 from firebase_config import FIREBASE_CONFIG, AUTH_URL, FIRESTORE_URL
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _json_dumps(obj) -> str:
+    """Serialize to a JSON string (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def _json_loads(data):
+    """Parse JSON from str or bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class FirebaseAuth:
     """Firebase Authentication Handler"""
@@ -166,7 +186,7 @@ class FirebaseAuth:
             
             # Simplified storage - just save as JSON string for now
             fields = {
-                "data": {"stringValue": json.dumps(meal_plan)},
+                "data": {"stringValue": _json_dumps(meal_plan)},
                 "created_at": {"timestampValue": datetime.now().isoformat() + "Z"}
             }
             
@@ -180,33 +200,64 @@ class FirebaseAuth:
             st.error(f"Save meal plan error: {e}")
             return False
     
+    def get_meal_plan_documents(self, user_id: str, id_token: str) -> List[Tuple[str, Dict]]:
+        """
+        Get all meal plans for user as (document name, plan) pairs
+        
+        Raises requests.RequestException on a failed request or non-200 response,
+        so callers can tell "no plans" apart from "couldn't load plans".
+        """
+        url = f"{self.firestore_url}/users/{user_id}/meal_plans"
+        headers = {"Authorization": f"Bearer {id_token}"}
+        
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+        
+        data = _json_loads(response.content)
+        documents = data.get('documents', [])
+        
+        meal_plans = []
+        for doc in documents:
+            fields = doc.get('fields', {})
+            if 'data' in fields:
+                plan_data = _json_loads(fields['data']['stringValue'])
+                meal_plans.append((doc.get('name', ''), plan_data))
+        
+        return meal_plans
+    
     def get_meal_plans(self, user_id: str, id_token: str) -> list:
         """Get all meal plans for user"""
         try:
-            url = f"{self.firestore_url}/users/{user_id}/meal_plans"
-            headers = {"Authorization": f"Bearer {id_token}"}
-            
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                documents = data.get('documents', [])
-                
-                meal_plans = []
-                for doc in documents:
-                    fields = doc.get('fields', {})
-                    if 'data' in fields:
-                        plan_data = json.loads(fields['data']['stringValue'])
-                        meal_plans.append(plan_data)
-                
-                return meal_plans
-            else:
-                return []
-                
+            return [plan for _, plan in self.get_meal_plan_documents(user_id, id_token)]
+        except requests.HTTPError:
+            return []
         except Exception as e:
             st.error(f"Get meal plans error: {e}")
             return []
     
+    def delete_meal_plan_document(self, id_token: str, doc_name: str) -> bool:
+        """Delete a meal plan by its full Firestore document name"""
+        if not doc_name:
+            print("No document name found")
+            return False
+        
+        try:
+            print(f"Deleting document: {doc_name}")
+            
+            # The document name is the full resource path
+            response = requests.delete(
+                f"https://firestore.googleapis.com/v1/{doc_name}",
+                headers={"Authorization": f"Bearer {id_token}"},
+                timeout=5
+            )
+            
+            print(f"Delete response: {response.status_code}")
+            return response.status_code == 200
+            
+        except Exception as e:
+            print(f"Error deleting meal plan: {e}")
+            return False
+    
     def delete_meal_plan(self, user_id: str, id_token: str, plan_index: int) -> bool:
         """
         Delete a specific meal plan by index
@@ -238,25 +289,8 @@ class FirebaseAuth:
                 return False
             
             # Get the full document path to delete
-            doc_to_delete = documents[plan_index]
-            doc_name = doc_to_delete.get('name', '')
-            
-            if not doc_name:
-                print("No document name found")
-                return False
-            
-            print(f"Deleting document: {doc_name}")
-            
-            # Delete the document using full path
-            # The 'name' field contains the full resource path
-            delete_response = requests.delete(
-                f"https://firestore.googleapis.com/v1/{doc_name}",
-                headers=headers,
-                timeout=5
-            )
-            
-            print(f"Delete response: {delete_response.status_code}")
-            return delete_response.status_code == 200
+            doc_name = documents[plan_index].get('name', '')
+            return self.delete_meal_plan_document(id_token, doc_name)
             
         except Exception as e:
             print(f"Error deleting meal plan: {e}")
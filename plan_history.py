@@ -3,33 +3,88 @@ Meal Plan History and Selection
 Allow users to view and select from past generated plans
 """
 
+import requests
 import streamlit as st
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Tuple
 from auth import FirebaseAuth
+from store_manager import show_store_selector
+from src.meal_planner import MealPlanner
+
+
+def _clear_store_checkbox_state():
+    """Remove shopping checklist checkbox states from session state"""
+    # Checklist widgets register their keys in '_store_keys' when created
+    for key in st.session_state.pop('_store_keys', set()):
+        st.session_state.pop(key, None)
+
+
+@st.cache_resource
+def _get_auth() -> FirebaseAuth:
+    """Shared Firebase client - created once per process, not per rerun"""
+    return FirebaseAuth()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_meal_plans(user_id: str, id_token: str) -> list:
+    """
+    Fetch saved plans once per minute instead of on every rerun
+    
+    Returns (document name, plan, PlanSummary) triples so display fields are
+    extracted once per fetch and deletes can target the exact document.
+    An empty list is cached like any other result (saves and deletes clear
+    the cache); failed requests raise, and st.cache_data doesn't cache
+    exceptions - use _load_meal_plans instead of calling this directly.
+    """
+    plans = _get_auth().get_meal_plan_documents(user_id, id_token)
+    return [(doc_name, plan, _summarize_plan(plan)) for doc_name, plan in plans]
+
+
+def _load_meal_plans(user_id: str, id_token: str) -> list:
+    """Saved plans for the user, or [] (with an error shown if Firebase failed)"""
+    try:
+        return _fetch_meal_plans(user_id, id_token)
+    except requests.RequestException as e:
+        st.error(f"Couldn't load saved plans: {e}")
+        return []
+
+
+@lru_cache(maxsize=256)
+def _fmt_name(start: str, days: int) -> str:
+    """Cached display name - saved plans never change once written"""
+    # Parse date for better display
+    try:
+        start_obj = date.fromisoformat(start)
+        start_formatted = start_obj.strftime('%b %d, %Y')
+    except (TypeError, ValueError):
+        start_formatted = start
+    
+    return f"{days}-day plan starting {start_formatted}"
+
+
+@lru_cache(maxsize=256)
+def _preview(first_day_recipes: tuple) -> str:
+    """Cached preview text from (meal_type, recipe) pairs of the first day"""
+    preview_meals = [f"{meal_type.title()}: {recipe}"
+                     for meal_type, recipe in first_day_recipes if recipe]
+    
+    return " • ".join(preview_meals[:2])  # Show first 2 meals
 
 
 class PlanHistory:
     """Manage meal plan history and selection"""
     
     def __init__(self):
-        self.auth = FirebaseAuth()
+        self.auth = _get_auth()
     
-    def format_plan_display_name(self, plan: dict) -> str:
+    @staticmethod
+    def format_plan_display_name(plan: dict) -> str:
         """Create display name for a plan"""
-        start = plan.get('start_date', 'Unknown')
-        end = plan.get('end_date', 'Unknown')
-        days = len(plan.get('days', []))
-        
-        # Parse date for better display
-        try:
-            start_obj = datetime.strptime(start, '%Y-%m-%d')
-            start_formatted = start_obj.strftime('%b %d, %Y')
-        except:
-            start_formatted = start
-        
-        return f"{days}-day plan starting {start_formatted}"
+        return _fmt_name(plan.get('start_date', 'Unknown'), len(plan.get('days', [])))
     
-    def get_plan_preview(self, plan: dict) -> str:
+    @staticmethod
+    def get_plan_preview(plan: dict) -> str:
         """Get preview text for a plan"""
         if not plan or 'days' not in plan:
             return "No preview available"
@@ -37,14 +92,40 @@ class PlanHistory:
         first_day = plan['days'][0] if plan['days'] else {}
         meals = first_day.get('meals', {})
         
-        preview_meals = []
-        for meal_type in ['breakfast', 'lunch', 'dinner']:
-            if meal_type in meals:
-                recipe = meals[meal_type].get('recipe', '')
-                if recipe:
-                    preview_meals.append(f"{meal_type.title()}: {recipe}")
-        
-        return " • ".join(preview_meals[:2])  # Show first 2 meals
+        return _preview(tuple((meal_type, (meals.get(meal_type) or {}).get('recipe', ''))
+                              for meal_type in ('breakfast', 'lunch', 'dinner')))
+
+
+class PlanSummary(NamedTuple):
+    """Display fields of a saved plan, flattened once at fetch time"""
+    name: str
+    preview: str
+    start_date: str
+    end_date: str
+    num_days: int
+    sample_days: Tuple[str, ...]
+
+
+def _summarize_plan(plan: dict) -> PlanSummary:
+    """Walk a plan's nested dicts once and keep only what the selector renders"""
+    days = plan.get('days') or []
+    
+    # First 3 days preview, formatted in one pass
+    sample_days = [
+        f"**Day {day.get('day', '?')}:** " + " • ".join(
+            ((day.get('meals') or {}).get(meal_type) or {}).get('recipe', 'N/A')
+            for meal_type in ('breakfast', 'lunch', 'dinner'))
+        for day in days[:3]
+    ]
+    
+    return PlanSummary(
+        name=PlanHistory.format_plan_display_name(plan),
+        preview=PlanHistory.get_plan_preview(plan),
+        start_date=plan.get('start_date', 'N/A'),
+        end_date=plan.get('end_date', 'N/A'),
+        num_days=len(days),
+        sample_days=tuple(sample_days)
+    )
 
 
 def show_plan_selector():
@@ -52,8 +133,12 @@ def show_plan_selector():
     
     st.subheader("📅 Select or Generate Meal Plan")
     
+    # Read session flags once per rerun
+    just_activated = st.session_state.get('plan_just_activated', False)
+    stores_selected = st.session_state.get('stores_selected', False)
+    
     # Show success message if plan was just activated
-    if st.session_state.get('plan_just_activated', False):
+    if just_activated:
         st.success("✅ **Plan Activated Successfully!**")
         st.info("👉 Click the **'View Results'** tab above to see your meal plan and shopping list.")
         
@@ -62,18 +147,16 @@ def show_plan_selector():
             st.session_state.plan_just_activated = False
             st.rerun()
         
-        # Don't show selector if we just activated
-        st.session_state.plan_just_activated = False  # Clear for next time
+        # Don't show selector while the banner is up (cleared by the button above or Switch)
         return
     
     user_id = st.session_state.user['user_id']
     id_token = st.session_state.user['id_token']
     
-    auth = FirebaseAuth()
-    history = PlanHistory()
+    auth = _get_auth()
     
-    # Get saved plans
-    saved_plans = auth.get_meal_plans(user_id, id_token)
+    # Get saved plans (cached - cleared whenever a plan is saved or deleted)
+    saved_plans = _load_meal_plans(user_id, id_token)
     
     # Tab options
     tab1, tab2 = st.tabs(["📂 Past Plans", "✨ Generate New"])
@@ -83,33 +166,39 @@ def show_plan_selector():
         if saved_plans:
             st.write(f"You have **{len(saved_plans)}** saved plan(s)")
             
-            # Show each plan
-            for idx, plan in enumerate(saved_plans):
-                plan_name = history.format_plan_display_name(plan)
-                plan_preview = history.get_plan_preview(plan)
+            # Paginate so only one page of expanders is built per rerun
+            page_size = 10
+            last_page = (len(saved_plans) - 1) // page_size
+            page = min(st.session_state.setdefault('plans_page', 0), last_page)
+            page_start = page * page_size
+            
+            # Only one plan's details are built at a time (first on the page by default)
+            expanded_idx = st.session_state.get('expanded_plan_idx', page_start)
+            if not page_start <= expanded_idx < page_start + page_size:
+                expanded_idx = page_start
+            
+            # Show each plan on this page (idx stays the index into saved_plans)
+            for idx, (doc_name, plan, summary) in enumerate(saved_plans[page_start:page_start + page_size],
+                                                   start=page_start):
+                is_open = (idx == expanded_idx)
                 
-                with st.expander(f"**{idx + 1}.** {plan_name}", expanded=(idx == 0)):
-                    st.caption(plan_preview)
+                with st.expander(f"**{idx + 1}.** {summary.name}", expanded=is_open):
+                    st.caption(summary.preview)
                     
-                    col1, col2, col3 = st.columns([2, 2, 1])
+                    # Collapsed plans get a single button instead of their full body
+                    if not is_open:
+                        if st.button("Show details", key=f"show_plan_{idx}"):
+                            st.session_state.expanded_plan_idx = idx
+                            st.rerun()
+                        continue
                     
-                    with col1:
-                        st.write(f"**Start:** {plan.get('start_date', 'N/A')}")
-                    with col2:
-                        st.write(f"**End:** {plan.get('end_date', 'N/A')}")
-                    with col3:
-                        st.write(f"**Days:** {len(plan.get('days', []))}")
+                    st.markdown(f"**Start:** {summary.start_date} &nbsp;&nbsp; "
+                                f"**End:** {summary.end_date} &nbsp;&nbsp; "
+                                f"**Days:** {summary.num_days}")
                     
                     # Show first 3 days preview
-                    if plan.get('days'):
-                        st.markdown("**Sample Days:**")
-                        for day in plan['days'][:3]:
-                            meals = day.get('meals', {})
-                            breakfast = meals.get('breakfast', {}).get('recipe', 'N/A')
-                            lunch = meals.get('lunch', {}).get('recipe', 'N/A')
-                            dinner = meals.get('dinner', {}).get('recipe', 'N/A')
-                            
-                            st.write(f"**Day {day.get('day', '?')}:** {breakfast} • {lunch} • {dinner}")
+                    if summary.sample_days:
+                        st.markdown("**Sample Days:**\n\n" + "\n\n".join(summary.sample_days))
                     
                     st.markdown("---")
                     
@@ -128,22 +217,33 @@ def show_plan_selector():
                                 del st.session_state.shopping_list
                             
                             # Clear checkbox states
-                            keys_to_delete = [key for key in st.session_state.keys() 
-                                             if any(key.startswith(store) for store in 
-                                                   ['costco_', 'whole_foods_', 'petes_fresh_market_', 
-                                                    'jewel_', 'aldi_'])]
-                            for key in keys_to_delete:
-                                del st.session_state[key]
+                            _clear_store_checkbox_state()
                             
                             st.rerun()
                     
                     with col2:
                         if st.button(f"🗑️ Delete", key=f"delete_plan_{idx}"):
-                            if auth.delete_meal_plan(user_id, id_token, idx):
+                            # By document name: list positions shift as plans come and go
+                            if auth.delete_meal_plan_document(id_token, doc_name):
+                                _fetch_meal_plans.clear()
                                 st.success("Plan deleted!")
                                 st.rerun()
                             else:
                                 st.error("Failed to delete plan")
+            
+            # Page navigation
+            if last_page > 0:
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if st.button("← Prev", key="plans_prev", disabled=(page == 0)):
+                        st.session_state.plans_page = page - 1
+                        st.rerun()
+                with col2:
+                    st.caption(f"Page {page + 1} of {last_page + 1}")
+                with col3:
+                    if st.button("Next →", key="plans_next", disabled=(page == last_page)):
+                        st.session_state.plans_page = page + 1
+                        st.rerun()
         
         else:
             st.info("No saved plans yet. Generate your first plan in the 'Generate New' tab!")
@@ -153,11 +253,10 @@ def show_plan_selector():
         st.write("Generate a fresh meal plan")
         
         # Step 1: Store Selection
-        if not st.session_state.get('stores_selected', False):
+        if not stores_selected:
             st.markdown("### 👉 Step 1: Choose Your Stores")
             st.info("Select which stores you want to shop at for this meal plan")
             
-            from store_manager import show_store_selector
             selected_stores = show_store_selector()
             
             if selected_stores:
@@ -187,7 +286,7 @@ def show_plan_selector():
                                       help="How many days to plan for")
             
             with col2:
-                start_date = st.date_input("Start date", value=datetime.now())
+                start_date = st.date_input("Start date", value=date.today())
             
             if st.button("🎲 Generate New Plan", type="primary", use_container_width=True):
                 with st.spinner("Generating your meal plan..."):
@@ -200,20 +299,15 @@ def show_plan_selector():
                         st.session_state.checklist_state = {}
                     
                     # Clear all checkbox states
-                    keys_to_delete = [key for key in st.session_state.keys() 
-                                     if any(key.startswith(store) for store in 
-                                           ['costco_', 'whole_foods_', 'petes_fresh_market_', 
-                                            'jewel_', 'aldi_'])]
-                    for key in keys_to_delete:
-                        del st.session_state[key]
+                    _clear_store_checkbox_state()
                     
                     # Generate new plan
-                    from src.meal_planner import MealPlanner
                     planner = MealPlanner()
                     meal_plan = planner.generate_meal_plan(start_date)
                     
                     # Save to Firebase
                     if auth.save_meal_plan(user_id, id_token, meal_plan):
+                        _fetch_meal_plans.clear()
                         st.session_state.meal_plan = meal_plan
                         st.session_state.just_generated = True
                         st.session_state.active_plan_index = 0
@@ -231,13 +325,10 @@ def show_plan_selector():
 def show_active_plan_indicator():
     """Show which plan is currently active"""
     
-    # Don't show if no plan loaded
-    if 'meal_plan' not in st.session_state or st.session_state.meal_plan is None:
-        return
-    
-    plan = st.session_state.meal_plan
+    plan = st.session_state.get('meal_plan')
+    just_generated = st.session_state.get('just_generated', False)
     
-    # Double-check plan is valid
+    # Don't show if no plan loaded / double-check plan is valid
     if not plan or not isinstance(plan, dict):
         return
     
@@ -248,7 +339,7 @@ def show_active_plan_indicator():
         start_date = plan.get('start_date', 'Unknown')
         end_date = plan.get('end_date', 'Unknown')
         
-        if st.session_state.get('just_generated', False):
+        if just_generated:
             st.info(f"📋 **Active Plan:** {start_date} to {end_date} (Just Generated)")
         else:
             st.info(f"📋 **Active Plan:** {start_date} to {end_date} (Loaded from history)")
@@ -258,6 +349,7 @@ def show_active_plan_indicator():
             # Clear meal plan to force showing selector
             st.session_state.meal_plan = None
             st.session_state.just_generated = False
+            st.session_state.plan_just_activated = False
             if 'active_plan_index' in st.session_state:
                 del st.session_state.active_plan_index
             st.rerun()
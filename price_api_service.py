@@ -5,11 +5,281 @@ Supports: Instacart, Kroger, fallback estimates
 """
 
 import os
+import re
+import sys
+import time
+import asyncio
+import sqlite3
+import threading
 import requests
 import json
-from typing import Dict, Optional, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Optional, List, Tuple
 from datetime import datetime, timedelta
 from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Products checked per Kroger search when matching a batch item by name
+KROGER_BATCH_CANDIDATES = 5
+
+# Threads for parallel shopping-list lookups / background prefetch + refresh
+LOOKUP_WORKERS = 8
+BACKGROUND_WORKERS = 4
+
+# Transport failures (after the session's own retries) - the API is treated as
+# down for OUTAGE_BACKOFF_SECONDS and items are priced from estimates meanwhile
+_NETWORK_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.RetryError)
+OUTAGE_BACKOFF_SECONDS = 300
+
+# Credentials looked up in Streamlit secrets / secrets.toml
+SECRET_KEYS = ('INSTACART_API_KEY', 'KROGER_CLIENT_ID', 'KROGER_CLIENT_SECRET')
+
+# On-disk price cache, shared by restarts and every worker process
+PRICE_CACHE_PATH = '.cache/prices.sqlite3'
+
+# Base price estimates by category
+_BASE_PRICES = {
+    # Proteins
+    'chicken thighs': 2.50,
+    'chicken breast': 3.99,
+    'salmon': 12.99,
+    'white fish': 8.99,
+    'whiting': 6.99,
+    'ground turkey': 4.99,
+    'turkey bacon': 5.99,
+    'eggs': 4.99,
+    
+    # Produce
+    'sweet potato': 1.29,
+    'onion': 0.89,
+    'spinach': 2.99,
+    'tomato': 1.99,
+    'bell pepper': 1.49,
+    'avocado': 1.99,
+    'lemon': 0.79,
+    
+    # Pantry
+    'rice': 1.50,
+    'olive oil': 8.99,
+    'coconut oil': 7.99,
+    'canned tomatoes': 1.29,
+    'beans': 1.19,
+    'lentils': 1.49,
+    'pasta': 1.29,
+    'oats': 3.99,
+}
+
+# All category keys in one precompiled pattern (longest first, so
+# "canned tomatoes" wins over "tomato") - one scan per item name
+_BASE_PRICE_PATTERN = re.compile(
+    '|'.join(re.escape(key) for key in sorted(_BASE_PRICES, key=len, reverse=True))
+)
+
+# Store-specific adjustments to the base estimates
+_STORE_MULTIPLIERS = {
+    'costco': 0.85,  # Costco typically 15% cheaper (but bulk)
+    'whole_foods': 1.25,  # Whole Foods ~25% more expensive
+    'jewel': 1.0,  # Baseline
+    'petes_fresh_market': 0.95,  # Slightly cheaper
+    'aldi': 0.80  # Aldi typically cheapest
+}
+
+# Map our store names to Instacart store IDs
+_INSTACART_STORE_MAPPING = {
+    'costco': 'costco',
+    'whole_foods': 'whole_foods',
+    'jewel': 'jewel_osco',
+    'petes_fresh_market': 'petes_fresh_market',
+    'aldi': 'aldi'
+}
+
+# Map Kroger store names to our app's store names (lowercase keywords)
+_KROGER_STORE_KEYWORDS = {
+    'jewel': ('jewel', 'jewel-osco', 'jewel osco'),
+    'marianos': ('mariano', "mariano's", 'marianos'),
+    'food_4_less': ('food 4 less', 'food4less'),
+    'pick_n_save': ('pick n save', "pick 'n save"),
+}
+
+# One case-insensitive pattern over every keyword; the named group that
+# matched (m.lastgroup) says which chain a location belongs to
+_KROGER_STORE_PATTERN = re.compile(
+    '|'.join(f"(?P<{store}>{'|'.join(map(re.escape, keywords))})"
+             for store, keywords in _KROGER_STORE_KEYWORDS.items()),
+    re.IGNORECASE
+)
+
+
+def _json_dumps(obj) -> str:
+    """Serialize to a JSON string (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def _json_loads(data):
+    """Parse JSON from str or bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@lru_cache(maxsize=1)
+def _load_streamlit_secrets() -> Dict:
+    """API keys from Streamlit secrets (empty outside a Streamlit app)"""
+    print("[STREAMLIT] Trying Streamlit secrets...")
+    try:
+        import streamlit as st
+        return {key: st.secrets.get(key) for key in SECRET_KEYS}
+    except Exception as e:
+        return {}  # Not running in Streamlit context
+
+
+@lru_cache(maxsize=1)
+def _load_secrets_file() -> Dict:
+    """API keys read straight from .streamlit/secrets.toml"""
+    try:
+        import toml
+        secrets_path = '.streamlit/secrets.toml'
+        
+        if os.path.exists(secrets_path):
+            return toml.load(secrets_path)
+    except Exception as e:
+        pass  # toml not installed or secrets file unreadable
+    return {}
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry expiry
+    
+    Least recently used entries are evicted once maxsize is reached, and
+    entries older than ttl seconds are treated as missing. Thread-safe.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[0]
+    
+    def __setitem__(self, key, value):
+        self._set(key, value, self.ttl)
+    
+    def _set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class PersistentTTLCache(TTLCache):
+    """
+    TTLCache backed by a SQLite file so prices survive restarts
+    
+    Memory is checked first; misses fall through to disk and are promoted.
+    If the file can't be opened (e.g. read-only filesystem) it quietly
+    behaves as a plain TTLCache.
+    """
+    
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._db = None
+        self._db_lock = threading.Lock()
+        
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Price cache persistence disabled: {e}")
+            self._db = None
+    
+    def get(self, key, default=None):
+        value = super().get(key)
+        if value is not None or self._db is None:
+            return default if value is None else value
+        
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (_json_dumps(key),)
+                ).fetchone()
+        except sqlite3.Error:
+            return default
+        
+        if row is None:
+            return default
+        
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return default
+        
+        value = _json_loads(row[0])
+        self._set(key, value, remaining)
+        return value
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if self._db is None:
+            return
+        
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (_json_dumps(key), _json_dumps(value), time.time() + self.ttl)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Price cache write failed: {e}")
+    
+    def clear(self):
+        super().clear()
+        if self._db is None:
+            return
+        
+        try:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Price cache clear failed: {e}")
 
 
 class PriceAPIService:
@@ -29,40 +299,59 @@ class PriceAPIService:
         self.kroger_client_secret = os.getenv('KROGER_CLIENT_SECRET')
         
         
-        # If not in env, try Streamlit secrets (when running in Streamlit)
-        if not self.kroger_client_id:
-            print("[STREAMLIT] Trying Streamlit secrets...")
-            try:
-                import streamlit as st
-                self.instacart_key = self.instacart_key or st.secrets.get('INSTACART_API_KEY')
-                self.kroger_client_id = st.secrets.get('KROGER_CLIENT_ID')
-                self.kroger_client_secret = st.secrets.get('KROGER_CLIENT_SECRET')
-            except Exception as e:
-                pass  # Not running in Streamlit context
-        else:
-            print("[STREAMLIT] Skipped (already have credentials from env)")
-        
-        # If still not found, try loading from secrets file directly
-        if not self.kroger_client_id:
-            try:
-                import toml
-                secrets_path = '.streamlit/secrets.toml'
-                
-                if os.path.exists(secrets_path):
-                    secrets = toml.load(secrets_path)
-                    self.instacart_key = self.instacart_key or secrets.get('INSTACART_API_KEY')
-                    self.kroger_client_id = secrets.get('KROGER_CLIENT_ID')
-                    self.kroger_client_secret = secrets.get('KROGER_CLIENT_SECRET')
-                else:
-            except Exception as e:
+        # If not in env, try Streamlit secrets, then the secrets file directly
+        # (each source is read once per process)
+        for load_secrets in (_load_streamlit_secrets, _load_secrets_file):
+            if self.kroger_client_id:
+                break
+            secrets = load_secrets()
+            self.instacart_key = self.instacart_key or secrets.get('INSTACART_API_KEY')
+            self.kroger_client_id = secrets.get('KROGER_CLIENT_ID')
+            self.kroger_client_secret = secrets.get('KROGER_CLIENT_SECRET')
         
         # Cache for API responses (avoid repeated calls)
-        self.cache = {}
+        # Entries are fresh for cache_duration; after that they're still served
+        # (and refreshed in the background) until stale_duration runs out
         self.cache_duration = timedelta(hours=24)  # Prices valid for 24 hours
+        self.stale_duration = timedelta(days=7)
+        self.cache = PersistentTTLCache(PRICE_CACHE_PATH, maxsize=4096,
+                                        ttl=self.stale_duration.total_seconds())
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        # cache key -> time.time() before which a failed refresh isn't retried
+        self._refresh_retry_at = {}
+        
+        # API name -> time.time() before which it is skipped after an outage
+        self._api_down_until = {}
         
         # Kroger token
         self.kroger_token = None
         self.kroger_token_expiry = None
+        
+        # Kroger location per zipcode: zipcode -> ((location_id, store_name), timestamp)
+        self._location_cache = {}
+        self.location_cache_duration = timedelta(hours=24)  # Stores rarely move
+        
+        # Shared HTTP session - keeps TCP/TLS connections alive between calls.
+        # One pool per API host, each holding a keep-alive connection for every
+        # worker thread, so parallel lookups never open throwaway connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=2,  # api.instacart.com, api.kroger.com
+            pool_maxsize=LOOKUP_WORKERS + BACKGROUND_WORKERS,
+            # GET only - the one POST is the Kroger token request, which
+            # shouldn't be replayed blindly. Retry-After is ignored so a 429 can't
+            # park a lookup worker for as long as the server asks; the backoff
+            # tops out at about a second
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504],
+                              allowed_methods=['GET'], respect_retry_after_header=False)
+        )
+        self.session.mount('https://', adapter)
+        
+        # Background workers for prefetching and stale-price refreshes
+        self._executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS,
+                                            thread_name_prefix='price-prefetch')
+        self._prefetch_futures = []
     
     # ============================================================================
     # MAIN PRICE FETCHING METHOD
@@ -91,32 +380,101 @@ class PriceAPIService:
                 'confidence': 'high' or 'medium' or 'low'
             }
         """
-        # Check cache first
-        cache_key = f"{item_name}_{store}_{zipcode}"
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if datetime.now() - cached_data['timestamp'] < self.cache_duration:
-                return cached_data['data']
+        # Check cache first - stale entries are returned right away and
+        # refreshed in the background; only a full miss waits on the network
+        cache_key = self._cache_key(item_name, store, zipcode)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            if time.time() >= cached['fresh_until']:
+                self._schedule_refresh(cache_key, item_name, store, zipcode, cached['data'])
+            return cached['data']
+        
+        return self._fetch_price(cache_key, item_name, store, zipcode)
+    
+    def _fetch_price(self, cache_key: Tuple[str, str, str], item_name: str, store: str, zipcode: str,
+                     stale: Optional[Dict] = None) -> Dict:
+        """
+        Fetch from the best available source and cache the result
+        
+        stale is the expired entry being refreshed, if any: when it holds a
+        real API price and no API answers now, it's kept (not replaced by an
+        estimate) and the refresh is retried after OUTAGE_BACKOFF_SECONDS.
+        """
+        degraded = False  # An API we'd normally ask is down
         
         # Try Instacart first (best coverage)
         if self.instacart_key:
-            price_data = self._fetch_from_instacart(item_name, store, zipcode)
+            price_data, down = self._call_api('instacart', self._fetch_from_instacart, item_name, store, zipcode)
+            degraded = degraded or down
             if price_data:
                 self._cache_price(cache_key, price_data)
                 return price_data
         
         # Try Kroger for Jewel-Osco
         if store == 'jewel' and self.kroger_client_id:
-            price_data = self._fetch_from_kroger(item_name, zipcode)
+            price_data, down = self._call_api('kroger', self._fetch_from_kroger, item_name, zipcode)
+            degraded = degraded or down
             if price_data:
                 self._cache_price(cache_key, price_data)
                 return price_data
         
-        # Fallback to estimates
+        # Keep serving the last real price through an outage / empty answer
+        if stale is not None and stale.get('source') != 'estimate':
+            self._refresh_retry_at[cache_key] = time.time() + OUTAGE_BACKOFF_SECONDS
+            return stale
+        
+        # Fallback to estimates (only briefly, if that's because an API is down)
         price_data = self._estimate_price(item_name, store)
-        self._cache_price(cache_key, price_data)
+        self._cache_price(cache_key, price_data,
+                          fresh_for=OUTAGE_BACKOFF_SECONDS if degraded else None)
         return price_data
     
+    def _api_available(self, api: str) -> bool:
+        """False while an API is backing off after a transport failure"""
+        return time.time() >= self._api_down_until.get(api, 0)
+    
+    def _mark_api_down(self, api: str, error: Exception):
+        print(f"{api.title()} API unavailable, backing off {OUTAGE_BACKOFF_SECONDS}s: {error}")
+        self._api_down_until[api] = time.time() + OUTAGE_BACKOFF_SECONDS
+    
+    def _call_api(self, api: str, fetch, *args) -> Tuple[Optional[Dict], bool]:
+        """
+        Run a fetcher unless its API is backing off
+        
+        Returns (price_data or None, api_down)
+        """
+        if not self._api_available(api):
+            return None, True
+        
+        try:
+            return fetch(*args), False
+        except _NETWORK_ERRORS as e:
+            self._mark_api_down(api, e)
+            return None, True
+    
+    def _schedule_refresh(self, cache_key: Tuple[str, str, str], item_name: str, store: str, zipcode: str,
+                          stale: Dict):
+        """Re-fetch a stale price on the background pool (once per key at a time)"""
+        with self._refreshing_lock:
+            if cache_key in self._refreshing:
+                return
+            if time.time() < self._refresh_retry_at.get(cache_key, 0):
+                return  # Last refresh failed - wait out the backoff
+            self._refreshing.add(cache_key)
+        
+        def refresh():
+            try:
+                self._fetch_price(cache_key, item_name, store, zipcode, stale)
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(cache_key)
+        
+        try:
+            self._executor.submit(refresh)
+        except RuntimeError:  # Executor already shut down by close()
+            with self._refreshing_lock:
+                self._refreshing.discard(cache_key)
+    
     # ============================================================================
     # INSTACART API INTEGRATION
     # ============================================================================
@@ -130,16 +488,7 @@ class PriceAPIService:
         Visit: https://www.instacart.com/developer for actual endpoints
         """
         try:
-            # Map our store names to Instacart store IDs
-            store_mapping = {
-                'costco': 'costco',
-                'whole_foods': 'whole_foods',
-                'jewel': 'jewel_osco',
-                'petes_fresh_market': 'petes_fresh_market',
-                'aldi': 'aldi'
-            }
-            
-            instacart_store = store_mapping.get(store)
+            instacart_store = _INSTACART_STORE_MAPPING.get(store)
             if not instacart_store:
                 return None
             
@@ -156,10 +505,10 @@ class PriceAPIService:
                 "limit": 1
             }
             
-            response = requests.get(url, headers=headers, params=params, timeout=5)
+            response = self.session.get(url, headers=headers, params=params, timeout=5)
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 
                 if data.get('products') and len(data['products']) > 0:
                     product = data['products'][0]
@@ -179,8 +528,10 @@ class PriceAPIService:
             
             return None
             
-        except Exception as e:
-            print(f"Instacart API error: {e}")
+        except _NETWORK_ERRORS:
+            raise  # Caller backs off this API
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Instacart API error: {e}")  # Unexpected payload
             return None
     
     # ============================================================================
@@ -203,7 +554,7 @@ class PriceAPIService:
             url = "https://api.kroger.com/v1/connect/oauth2/token"
             
             
-            response = requests.post(
+            response = self.session.post(
                 url,
                 data={
                     'grant_type': 'client_credentials',
@@ -215,17 +566,99 @@ class PriceAPIService:
             
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json_loads(response.content)
                 self.kroger_token = data['access_token']
                 # Tokens typically expire in 30 minutes
                 self.kroger_token_expiry = datetime.now() + timedelta(minutes=25)
                 return self.kroger_token
-            else:
             
             return None
             
-        except Exception as e:
+        except _NETWORK_ERRORS:
+            raise  # Caller backs off this API
+        except (ValueError, KeyError, TypeError) as e:
+            return None
+    
+    def _get_kroger_location(self, zipcode: str, headers: Dict) -> Optional[Tuple[str, str]]:
+        """
+        Find the closest supported Kroger-family store for a zipcode
+        
+        Returns (location_id, store_name), cached per zipcode for 24 hours so
+        product lookups skip the /v1/locations round trip
+        """
+        if zipcode in self._location_cache:
+            location, timestamp = self._location_cache[zipcode]
+            if datetime.now() - timestamp < self.location_cache_duration:
+                return location
+        
+        # NOTE: Search for ANY Kroger-family store, not just Jewel-Osco
+        # Kroger owns: Jewel-Osco, Mariano's, etc.
+        location_url = "https://api.kroger.com/v1/locations"
+        location_params = {
+            "filter.zipCode.near": zipcode,
+            "filter.limit": "10",  # Get multiple stores, pick closest
+            "filter.radiusInMiles": "25"  # Search 25 mile radius
+        }
+        
+        location_response = self.session.get(
+            location_url,
+            headers=headers,
+            params=location_params,
+            timeout=5
+        )
+        
+        if location_response.status_code != 200:
+            return None
+        
+        locations = _json_loads(location_response.content).get('data', [])
+        
+        if not locations:
+            return None
+        
+        # Filter locations to only stores we support
+        # Priority: Jewel-Osco first, then Mariano's (both Kroger-owned)
+        supported_locations = []
+        for loc in locations:
+            match = _KROGER_STORE_PATTERN.search(loc.get('name', ''))
+            chain = match.lastgroup if match else None
+            
+            # Check if this is a Jewel-Osco (highest priority)
+            if chain == 'jewel':
+                supported_locations.insert(0, loc)  # Add to front
+            # Check for Mariano's (also supported - it's Kroger-owned)
+            elif chain == 'marianos':
+                supported_locations.append(loc)  # Add Mariano's
+        
+        if not supported_locations:
             return None
+        
+        # Use the first supported location (prioritized Jewel-Osco)
+        location = (supported_locations[0]['locationId'], supported_locations[0].get('name', 'Unknown'))
+        self._location_cache[zipcode] = (location, datetime.now())
+        return location
+    
+    def _kroger_price_result(self, product: Dict, item_name: str) -> Optional[Dict]:
+        """Convert a Kroger product record into our price format"""
+        items = product.get('items', [])
+        
+        if not items:
+            return None
+        
+        item = items[0]
+        price_info = item.get('price', {})
+        
+        return {
+            'item': product.get('description', item_name),
+            'price': float(price_info.get('regular', 0)),
+            'unit': item.get('size', 'each'),
+            'price_per_unit': float(price_info.get('promo', price_info.get('regular', 0))),
+            'unit_type': 'each',
+            'store': 'jewel',
+            'source': 'kroger',
+            'in_stock': True,
+            'last_updated': datetime.now().isoformat(),
+            'confidence': 'high'
+        }
     
     def _fetch_from_kroger(self, item_name: str, zipcode: str) -> Optional[Dict]:
         """
@@ -239,126 +672,118 @@ class PriceAPIService:
             if not token:
                 return None
             
-            
-            # First, get location ID for zipcode
-            # NOTE: Search for ANY Kroger-family store, not just Jewel-Osco
-            # Kroger owns: Jewel-Osco, Mariano's, etc.
-            location_url = "https://api.kroger.com/v1/locations"
             headers = {"Authorization": f"Bearer {token}"}
-            location_params = {
-                "filter.zipCode.near": zipcode,
-                "filter.limit": "10",  # Get multiple stores, pick closest
-                "filter.radiusInMiles": "25"  # Search 25 mile radius
-            }
-            
             
-            location_response = requests.get(
-                location_url,
-                headers=headers,
-                params=location_params,
-                timeout=5
-            )
-            
-            
-            if location_response.status_code != 200:
-                return None
-            
-            locations = location_response.json().get('data', [])
-            
-            # DEBUG: Show ALL store names to see what API returns
-            for i, loc in enumerate(locations):
-                name = loc.get('name', 'Unknown')
-                city = loc.get('address', {}).get('city', 'Unknown')
-                chain = loc.get('chain', 'Unknown')
-            
-            if not locations:
+            # First, get location ID for zipcode
+            location = self._get_kroger_location(zipcode, headers)
+            if not location:
                 return None
             
-            # Map Kroger store names to our app's store names
-            store_name_mapping = {
-                'jewel': ['jewel', 'jewel-osco', 'jewel osco'],
-                'marianos': ['mariano', "mariano's", 'marianos'],
-                'food_4_less': ['food 4 less', 'food4less'],
-                'pick_n_save': ['pick n save', "pick 'n save"],
-            }
-            
-            # Filter locations to only stores we support
-            # Priority: Jewel-Osco first, then Mariano's (both Kroger-owned)
-            supported_locations = []
-            for loc in locations:
-                store_name_lower = loc.get('name', '').lower()
-                
-                # Check if this is a Jewel-Osco (highest priority)
-                if any(keyword in store_name_lower for keyword in store_name_mapping['jewel']):
-                    supported_locations.insert(0, loc)  # Add to front
-                # Check for Mariano's (also supported - it's Kroger-owned)
-                elif any(keyword in store_name_lower for keyword in store_name_mapping.get('marianos', [])):
-                    supported_locations.append(loc)  # Add Mariano's
-                else:
+            location_id = location[0]
             
-            if not supported_locations:
-                return None
+            # Now search for product
+            products = self._search_kroger_products(item_name, location_id, headers, limit=1)
+            if products:
+                return self._kroger_price_result(products[0], item_name)
             
-            # Use the first supported location (prioritized Jewel-Osco)
-            location_id = supported_locations[0]['locationId']
-            store_name = supported_locations[0].get('name', 'Unknown')
-            store_city = supported_locations[0].get('address', {}).get('city', 'Unknown')
+            return None
             
-            # Now search for product
-            product_url = "https://api.kroger.com/v1/products"
-            product_params = {
+        except _NETWORK_ERRORS:
+            raise  # Caller backs off this API
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Kroger API error: {e}")  # Unexpected payload
+            return None
+    
+    def _search_kroger_products(self, item_name: str, location_id: str, headers: Dict,
+                                limit: int) -> List[Dict]:
+        """One Kroger product search (plain keywords - the API has no OR)"""
+        product_response = self.session.get(
+            "https://api.kroger.com/v1/products",
+            headers=headers,
+            params={
                 'filter.term': item_name,
                 'filter.locationId': location_id,
-                'filter.limit': 1
-            }
-            
-            
-            product_response = requests.get(
-                product_url,
-                headers=headers,
-                params=product_params,
-                timeout=5
-            )
+                'filter.limit': limit
+            },
+            timeout=5
+        )
+        
+        if product_response.status_code != 200:
+            print(f"Kroger product search for {item_name!r} failed: {product_response.status_code}")
+            return []
+        
+        return _json_loads(product_response.content).get('data', [])
+    
+    def _match_kroger_product(self, item_name: str, location_id: str, headers: Dict) -> Optional[Dict]:
+        """
+        Search Kroger for one item, keeping only a product whose description
+        names it as a whole word ("egg" matches "Large Eggs", not "Eggplant")
+        """
+        products = self._search_kroger_products(item_name, location_id, headers,
+                                                limit=KROGER_BATCH_CANDIDATES)
+        pattern = re.compile(rf"\b{re.escape(item_name.lower())}(?:s|es)?\b")
+        
+        for product in products:
+            if pattern.search(product.get('description', '').lower()):
+                return self._kroger_price_result(product, item_name)
+        return None
+    
+    def _fetch_from_kroger_batch(self, item_names: List[str], zipcode: str) -> Dict[str, Dict]:
+        """
+        Fetch Kroger prices for many items - one search per item, run
+        concurrently on the background pool, sharing one token and location
+        
+        Returns {item_name: price_data} for the items that could be matched;
+        anything missing should fall back to _fetch_from_kroger
+        """
+        results = {}
+        
+        try:
+            token = self._get_kroger_token()
+            if not token:
+                return results
             
+            headers = {"Authorization": f"Bearer {token}"}
             
-            if product_response.status_code == 200:
-                data = product_response.json()
-                products = data.get('data', [])
-                
-                
-                if products:
-                    product = products[0]
-                    
-                    items = product.get('items', [])
-                    
-                    if items:
-                        item = items[0]
-                        price_info = item.get('price', {})
-                        
-                        
-                        result = {
-                            'item': product.get('description', item_name),
-                            'price': float(price_info.get('regular', 0)),
-                            'unit': item.get('size', 'each'),
-                            'price_per_unit': float(price_info.get('promo', price_info.get('regular', 0))),
-                            'unit_type': 'each',
-                            'store': 'jewel',
-                            'source': 'kroger',
-                            'in_stock': True,
-                            'last_updated': datetime.now().isoformat(),
-                            'confidence': 'high'
-                        }
-                        
-                        return result
-                    else:
-                else:
-            else:
+            location = self._get_kroger_location(zipcode, headers)
+            if not location:
+                return results
             
-            return None
+            location_id = location[0]
+        except _NETWORK_ERRORS as e:
+            self._mark_api_down('kroger', e)
+            return results
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Kroger API error: {e}")  # Unexpected payload
+            return results
+        
+        try:
+            futures = {
+                self._executor.submit(self._match_kroger_product, item_name, location_id, headers): item_name
+                for item_name in item_names
+            }
+        except RuntimeError:  # Executor already shut down by close()
+            return results
+        
+        for future in as_completed(futures):
+            try:
+                price_data = future.result()
+            except _NETWORK_ERRORS as e:
+                # Backing off - don't start the searches still queued
+                self._mark_api_down('kroger', e)
+                for pending in futures:
+                    pending.cancel()
+                continue
+            except CancelledError:
+                continue
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Kroger API error: {e}")  # Unexpected payload
+                continue
             
-        except Exception as e:
-            print(f"Kroger API error: {e}")
-            return None
+            if price_data:
+                results[futures[future]] = price_data
+        
+        return results
     
     # ============================================================================
     # FALLBACK: INTELLIGENT PRICE ESTIMATION
@@ -369,90 +794,103 @@ class PriceAPIService:
         Intelligent price estimation based on item type and store
         Uses heuristics when APIs are unavailable
         """
-        item_lower = item_name.lower()
-        
-        # Base price estimates by category
-        base_prices = {
-            # Proteins
-            'chicken thighs': 2.50,
-            'chicken breast': 3.99,
-            'salmon': 12.99,
-            'white fish': 8.99,
-            'whiting': 6.99,
-            'ground turkey': 4.99,
-            'turkey bacon': 5.99,
-            'eggs': 4.99,
-            
-            # Produce
-            'sweet potato': 1.29,
-            'onion': 0.89,
-            'spinach': 2.99,
-            'tomato': 1.99,
-            'bell pepper': 1.49,
-            'avocado': 1.99,
-            'lemon': 0.79,
-            
-            # Pantry
-            'rice': 1.50,
-            'olive oil': 8.99,
-            'coconut oil': 7.99,
-            'canned tomatoes': 1.29,
-            'beans': 1.19,
-            'lentils': 1.49,
-            'pasta': 1.29,
-            'oats': 3.99,
-        }
+        return self._estimate_prices_batch([item_name], store)[0]
+    
+    def _estimate_prices_batch(self, item_names: List[str], store: str) -> List[Dict]:
+        """
+        Estimate prices for many items at one store in a single pass
         
-        # Find matching item
-        estimated_price = 5.00  # Default
+        The store multiplier and timestamp are looked up once for the whole
+        list; each name costs one pattern scan.
+        """
         unit = 'lb'
+        multiplier = _STORE_MULTIPLIERS.get(store, 1.0)  # Store-specific adjustments
+        last_updated = datetime.now().isoformat()
+        default_price = round(5.00 * multiplier, 2)  # No category matched
         
-        for key, price in base_prices.items():
-            if key in item_lower:
-                estimated_price = price
-                break
-        
-        # Store-specific adjustments
-        store_multipliers = {
-            'costco': 0.85,  # Costco typically 15% cheaper (but bulk)
-            'whole_foods': 1.25,  # Whole Foods ~25% more expensive
-            'jewel': 1.0,  # Baseline
-            'petes_fresh_market': 0.95,  # Slightly cheaper
-            'aldi': 0.80  # Aldi typically cheapest
-        }
+        search = _BASE_PRICE_PATTERN.search
+        estimates = []
         
-        multiplier = store_multipliers.get(store, 1.0)
-        final_price = estimated_price * multiplier
+        for item_name in item_names:
+            # Find matching item category
+            match = search(item_name.lower())
+            final_price = round(_BASE_PRICES[match.group()] * multiplier, 2) if match else default_price
+            
+            estimates.append({
+                'item': item_name.title(),
+                'price': final_price,
+                'unit': unit,
+                'price_per_unit': final_price,
+                'unit_type': unit,
+                'store': store,
+                'source': 'estimate',
+                'in_stock': True,
+                'last_updated': last_updated,
+                'confidence': 'low'
+            })
         
-        return {
-            'item': item_name.title(),
-            'price': round(final_price, 2),
-            'unit': unit,
-            'price_per_unit': round(final_price, 2),
-            'unit_type': unit,
-            'store': store,
-            'source': 'estimate',
-            'in_stock': True,
-            'last_updated': datetime.now().isoformat(),
-            'confidence': 'low'
-        }
+        return estimates
     
     # ============================================================================
     # BATCH OPERATIONS
     # ============================================================================
     
-    def get_shopping_list_prices(self, shopping_list: Dict, stores: List[str], zipcode: str) -> Dict:
+    async def get_price_async(self, item_name: str, store: str, zipcode: str = "60827") -> Dict:
         """
-        Get prices for entire shopping list across multiple stores
-        
-        Args:
-            shopping_list: Shopping list with items
-            stores: List of stores to check
-            zipcode: User's zipcode
+        Awaitable get_price - runs the blocking lookup on a worker thread
+        so many items can wait on the network at once
+        """
+        return await asyncio.to_thread(self.get_price, item_name, store, zipcode)
+    
+    def _warm_kroger_batch(self, shopping_list: Dict, zipcode: str):
+        """
+        Price uncached Jewel items with batched Kroger searches
+        (only when Instacart, which get_price tries first, isn't configured)
+        """
+        jewel_items = shopping_list.get('stores', {}).get('jewel', {}).get('items', [])
+        if not jewel_items or not self.kroger_client_id or self.instacart_key:
+            return
+        if not self._api_available('kroger'):
+            return
         
-        Returns:
-            Dictionary with prices by store
+        uncached = list(dict.fromkeys(
+            item['item'] for item in jewel_items
+            if self._cache_key(item['item'], 'jewel', zipcode) not in self.cache
+        ))
+        if uncached:
+            batch = self._fetch_from_kroger_batch(uncached, zipcode)
+            for item_name, price_data in batch.items():
+                self._cache_price(self._cache_key(item_name, 'jewel', zipcode), price_data)
+    
+    def _warm_estimates(self, shopping_list: Dict, zipcode: str):
+        """
+        Price uncached items at stores no API covers in one batch estimate,
+        so they don't each take a trip through get_price
         """
+        if self.instacart_key:
+            return
+        
+        for store_name, store_data in shopping_list.get('stores', {}).items():
+            if store_name == 'jewel' and self.kroger_client_id:
+                continue
+            
+            uncached = list(dict.fromkeys(
+                item['item'] for item in store_data.get('items', [])
+                if self._cache_key(item['item'], store_name, zipcode) not in self.cache
+            ))
+            for item_name, price_data in zip(uncached, self._estimate_prices_batch(uncached, store_name)):
+                self._cache_price(self._cache_key(item_name, store_name, zipcode), price_data)
+    
+    def _price_keys(self, shopping_list: Dict) -> List[Tuple[str, str]]:
+        """Distinct (item, store) pairs - repeats share the same lookup"""
+        return list(dict.fromkeys(
+            (item['item'], store_name)
+            for store_name, store_data in shopping_list.get('stores', {}).items()
+            for item in store_data.get('items', [])
+        ))
+    
+    def _assemble_prices(self, shopping_list: Dict, price_results: Dict) -> Dict:
+        """Build per-store totals from {(item, store): price_data or exception}"""
         results = {}
         
         for store_name, store_data in shopping_list.get('stores', {}).items():
@@ -460,14 +898,12 @@ class PriceAPIService:
             total_cost = 0
             
             for item in store_data.get('items', []):
-                item_name = item['item']
-                amount = item['amount']
-                
-                # Get price for this item
-                price_data = self.get_price(item_name, store_name, zipcode)
+                price_data = price_results[(item['item'], store_name)]
+                if isinstance(price_data, Exception):
+                    price_data = self._estimate_price(item['item'], store_name)
                 
                 # Calculate cost based on amount needed
-                item_cost = price_data['price_per_unit'] * amount
+                item_cost = price_data['price_per_unit'] * item['amount']
                 total_cost += item_cost
                 
                 store_prices.append({
@@ -484,20 +920,121 @@ class PriceAPIService:
         
         return results
     
+    async def get_shopping_list_prices_async(self, shopping_list: Dict, stores: List[str],
+                                             zipcode: str) -> Dict:
+        """
+        Get prices for entire shopping list, fetching all items concurrently
+        
+        Same arguments and return shape as get_shopping_list_prices
+        """
+        await asyncio.to_thread(self._warm_kroger_batch, shopping_list, zipcode)
+        self._warm_estimates(shopping_list, zipcode)
+        
+        unique_keys = self._price_keys(shopping_list)
+        fetched = await asyncio.gather(
+            *(self.get_price_async(item_name, store_name, zipcode) for item_name, store_name in unique_keys),
+            return_exceptions=True
+        )
+        
+        return self._assemble_prices(shopping_list, dict(zip(unique_keys, fetched)))
+    
+    def get_shopping_list_prices(self, shopping_list: Dict, stores: List[str], zipcode: str) -> Dict:
+        """
+        Get prices for entire shopping list across multiple stores
+        
+        Items are looked up in parallel on a thread pool (requests releases
+        the GIL while waiting on the network). Async callers can use
+        get_shopping_list_prices_async instead.
+        
+        Args:
+            shopping_list: Shopping list with items
+            stores: List of stores to check
+            zipcode: User's zipcode
+        
+        Returns:
+            Dictionary with prices by store
+        """
+        self._warm_kroger_batch(shopping_list, zipcode)
+        self._warm_estimates(shopping_list, zipcode)
+        
+        price_results = {}
+        
+        with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as executor:
+            futures = {
+                executor.submit(self.get_price, item_name, store_name, zipcode): (item_name, store_name)
+                for item_name, store_name in self._price_keys(shopping_list)
+            }
+            for future in as_completed(futures):
+                try:
+                    price_results[futures[future]] = future.result()
+                except Exception as e:
+                    price_results[futures[future]] = e
+        
+        return self._assemble_prices(shopping_list, price_results)
+    
+    @property
+    def _prefetch_in_progress(self) -> bool:
+        return any(not future.done() for future in self._prefetch_futures)
+    
+    def prefetch_shopping_list(self, shopping_list: Dict, stores: List[str], zipcode: str) -> bool:
+        """
+        Warm the cache for a shopping list the user is likely to open next
+        
+        Returns immediately; lookups run on background threads. Call after
+        the current page has rendered. Skipped (returns False) while an
+        earlier prefetch is still running or when everything is cached.
+        
+        Args:
+            shopping_list: Shopping list with items
+            stores: Stores to warm (all stores in the list if empty)
+            zipcode: User's zipcode
+        """
+        if self._prefetch_in_progress:
+            return False
+        
+        keys = list(dict.fromkeys(
+            (item['item'], store_name)
+            for store_name, store_data in shopping_list.get('stores', {}).items()
+            if not stores or store_name in stores
+            for item in store_data.get('items', [])
+            if self._cache_key(item['item'], store_name, zipcode) not in self.cache
+        ))
+        
+        if not keys:
+            return False
+        
+        self._prefetch_futures = [
+            self._executor.submit(self.get_price, item_name, store_name, zipcode)
+            for item_name, store_name in keys
+        ]
+        return True
+    
     # ============================================================================
     # CACHING
     # ============================================================================
     
-    def _cache_price(self, key: str, data: Dict):
-        """Cache price data"""
+    def _cache_key(self, item_name: str, store: str, zipcode: str) -> Tuple[str, str, str]:
+        """Cache key for one item at one store ("Onion" and "onion" share an entry)"""
+        return (sys.intern(item_name.lower()), sys.intern(store), sys.intern(str(zipcode)))
+    
+    def _cache_price(self, key: Tuple[str, str, str], data: Dict, fresh_for: Optional[float] = None):
+        """Cache price data (fresh for cache_duration unless fresh_for seconds is given)"""
+        self._refresh_retry_at.pop(key, None)
+        if fresh_for is None:
+            fresh_for = self.cache_duration.total_seconds()
         self.cache[key] = {
             'data': data,
-            'timestamp': datetime.now()
+            'fresh_until': time.time() + fresh_for
         }
     
     def clear_cache(self):
         """Clear all cached prices (e.g., when user wants fresh data)"""
-        self.cache = {}
+        self.cache.clear()
+    
+    def close(self):
+        """Close pooled HTTP connections and stop background prefetching"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
     
     # ============================================================================
     # UTILITY METHODS
@@ -513,21 +1050,21 @@ class PriceAPIService:
             'fallback': True
         }
         
-        # Test Instacart
-        if self.instacart_key:
-            try:
-                # Simple test query
-                test = self._fetch_from_instacart('eggs', 'costco', '60827')
-                status['instacart'] = test is not None
-            except:
-                pass
-        
-        # Test Kroger
-        if self.kroger_client_id:
-            try:
-                token = self._get_kroger_token()
-                status['kroger'] = token is not None
-            except Exception as e:
+        # Probe both APIs at once so the check takes the slower of the two,
+        # not their sum
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Simple test query
+            instacart_probe = (executor.submit(self._fetch_from_instacart, 'eggs', 'costco', '60827')
+                               if self.instacart_key else None)
+            kroger_probe = executor.submit(self._get_kroger_token) if self.kroger_client_id else None
+            
+            for api, probe in (('instacart', instacart_probe), ('kroger', kroger_probe)):
+                if probe is None:
+                    continue
+                try:
+                    status[api] = probe.result() is not None
+                except Exception as e:
+                    pass
         
         return status
 
@@ -536,11 +1073,15 @@ class PriceAPIService:
 # STREAMLIT INTEGRATION HELPERS
 # ============================================================================
 
-# @st.cache_resource  # Disabled for testing
+@lru_cache(maxsize=1)
 def get_price_service():
     """
     Get cached instance of PriceAPIService
     Use this in Streamlit to avoid recreating service
+    
+    One instance per process, shared by every session, so its thread pool,
+    HTTP session and price cache are created once. lru_cache rather than
+    st.cache_resource, so the module still imports without Streamlit.
     """
     return PriceAPIService()
 
@@ -12,27 +12,25 @@ def display_recipe_booklet_with_pdf(meal_plan, planner, auth):
     st.header("📖 Recipe Booklet")
     
     # Get unique recipes
-    unique_recipes = set()
-    for day in meal_plan['days']:
-        for meal_type, meal_info in day.get('meals', {}).items():
-            if meal_info and meal_info.get('recipe'):
-                unique_recipes.add(meal_info['recipe'])
+    unique_recipes = {meal_info['recipe']
+                      for day in meal_plan['days']
+                      for meal_info in day.get('meals', {}).values()
+                      if meal_info and meal_info.get('recipe')}
     
     st.markdown(f"### {len(unique_recipes)} Recipes in Your Plan")
     st.markdown(f"**Meal Plan:** {meal_plan['start_date']} to {meal_plan['end_date']}")
     st.markdown("---")
     
+    # Index recipes by name once (first match wins, as with the old scan)
+    recipe_index = {}
+    for recipes in planner.recipes.values():
+        for r in recipes:
+            recipe_index.setdefault(r['name'], r)
+    
     # Display each recipe
     for i, recipe_name in enumerate(sorted(unique_recipes), 1):
         # Find recipe
-        recipe = None
-        for category, recipes in planner.recipes.items():
-            for r in recipes:
-                if r['name'] == recipe_name:
-                    recipe = r
-                    break
-            if recipe:
-                break
+        recipe = recipe_index.get(recipe_name)
         
         if recipe:
             with st.expander(f"**{i}. {recipe['name']}** - {recipe.get('cuisine', 'N/A')}", 
@@ -3,11 +3,121 @@ Recipe Management Admin Panel
 Add, edit, browse, and manage recipes with serving size tracking
 """
 
+import os
+import json
+import bisect
+import sqlite3
+import threading
 import streamlit as st
 import yaml
 from pathlib import Path
 from typing import Dict, List
 from datetime import datetime
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Optional: faster JSON for the recipe copies
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Fields every imported recipe must have
+REQUIRED_RECIPE_FIELDS = frozenset(('name', 'servings'))
+
+# Recent search results kept per index (retyped / backspaced queries)
+SEARCH_CACHE_SIZE = 128
+
+
+def _json_dumps(obj) -> str:
+    """Serialize to a JSON string (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_loads(data):
+    """Parse JSON from str or bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _search_text(recipe: Dict) -> str:
+    """Lowercased name and cuisine, newline-separated so a match can't span both"""
+    return f"{recipe.get('name', '')}\n{recipe.get('cuisine', '')}".lower()
+
+
+def _write_json_copy(yaml_path: Path, mtime_ns: int, recipes: List[Dict]):
+    """Save a JSON copy of a category next to its YAML file (e.g. breakfast.json)"""
+    json_path = yaml_path.with_suffix('.json')
+    try:
+        tmp_path = json_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(_json_dumps({'yaml_mtime_ns': mtime_ns, 'recipes': recipes}))
+        os.replace(tmp_path, json_path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Could not write {json_path}: {e}")
+
+
+def _dump_recipes(recipes: List[Dict], f):
+    """
+    Write recipes to f as a YAML block sequence, one recipe at a time
+    
+    Each "- name: ..." item is dumped on its own, so only one recipe's text
+    is held in memory rather than the whole document.
+    """
+    if not recipes:
+        f.write('[]\n')
+        return
+    
+    for recipe in recipes:
+        yaml.dump([recipe], f, Dumper=SafeDumper, default_flow_style=False, sort_keys=False,
+                  allow_unicode=True)
+
+
+def _read_category(path: str, mtime_ns: int) -> List[Dict]:
+    """
+    Read a category file (no Streamlit calls - safe on worker threads)
+    
+    The JSON copy is used when it was made from this exact YAML version;
+    otherwise the YAML is parsed and the copy refreshed.
+    """
+    yaml_path = Path(path)
+    
+    try:
+        with open(yaml_path.with_suffix('.json'), 'rb') as f:
+            stored = _json_loads(f.read())
+        if stored['yaml_mtime_ns'] == mtime_ns:
+            return stored['recipes']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # No usable JSON copy
+    
+    with open(yaml_path, 'r') as f:
+        recipes = yaml.load(f, Loader=SafeLoader) or []
+    
+    _write_json_copy(yaml_path, mtime_ns, recipes)
+    return recipes
+
+
+@lru_cache(maxsize=16)
+def _load_category_cached(path: str, mtime_ns: int) -> tuple:
+    """
+    Load a category file, cached in-process until the file changes
+    
+    mtime_ns is only part of the cache key - a write bumps it, so the next
+    read reloads instead of returning the old recipes. Returned as a tuple
+    because every caller shares it; the recipe dicts must not be modified.
+    """
+    return tuple(_read_category(path, mtime_ns))
 
 
 class RecipeManager:
@@ -47,6 +157,14 @@ class RecipeManager:
             'snack',
             'sweet_treat'
         ]
+        
+        # Combined file of every category's recipes (derived from the YAML files)
+        self.combined_path = self.recipes_dir / "_index.json"
+        
+        # Search index, built lazily (see _get_index); the manager is shared
+        # by every session (see _get_manager), hence the lock
+        self._index = None
+        self._index_lock = threading.Lock()
     
     def load_recipes_from_category(self, category: str) -> List[Dict]:
         """Load all recipes from a category file"""
@@ -55,29 +173,96 @@ class RecipeManager:
         if not file_path.exists():
             return []
         
-        with open(file_path, 'r') as f:
-            recipes = yaml.safe_load(f) or []
+        # Cached per file version - reruns and searches skip the YAML parse
+        return list(_load_category_cached(str(file_path), file_path.stat().st_mtime_ns))
+    
+    def get_recipes(self, category: str) -> List[Dict]:
+        """
+        Recipes for a category, held in session state per file version
+        
+        load_recipes_from_category hands back a new list on every call; the
+        admin page reads the same category several times per rerun, so it
+        keeps one (read-only) list until the file changes.
+        """
+        file_path = self.recipes_dir / f"{category}.yaml"
+        mtime_ns = file_path.stat().st_mtime_ns if file_path.exists() else 0
         
-        return recipes
+        key = f"_recipes_{category}"
+        cached = st.session_state.get(key)
+        if cached is None or cached[0] != mtime_ns:
+            # Replaces the copy of the older file version
+            cached = (mtime_ns, self.load_recipes_from_category(category))
+            st.session_state[key] = cached
+        return cached[1]
     
-    def save_recipes_to_category(self, category: str, recipes: List[Dict]) -> bool:
-        """Save recipes to category file"""
+    def save_recipes_to_category(self, category: str, recipes: List[Dict], append: bool = False) -> bool:
+        """
+        Save recipes to category file
+        
+        With append=True, recipes are added after the existing ones by
+        appending to the file instead of rewriting it.
+        """
         try:
             file_path = self.recipes_dir / f"{category}.yaml"
             
-            with open(file_path, 'w') as f:
-                yaml.dump(recipes, f, default_flow_style=False, sort_keys=False, allow_unicode=True)
+            if append:
+                existing = self.load_recipes_from_category(category)
+                
+                # A block sequence can simply be continued; an empty (or
+                # missing) file may hold "[]", so that gets a full write
+                if existing:
+                    with open(file_path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        needs_newline = f.read(1) != b'\n'
+                    
+                    with open(file_path, 'a') as f:
+                        if needs_newline:
+                            f.write('\n')
+                        _dump_recipes(recipes, f)
+                    
+                    recipes = existing + recipes
+                else:
+                    append = False
+            
+            if not append:
+                with open(file_path, 'w') as f:
+                    _dump_recipes(recipes, f)
+            
+            # Fast-loading JSON copy of what the file now holds (the whole
+            # category - JSON can't be continued in place like the YAML)
+            _write_json_copy(file_path, file_path.stat().st_mtime_ns, recipes)
             
+            # Drop parsed copies of older file versions. _index.json and the
+            # search index are rebuilt on their next read, when the category
+            # signature no longer matches - not here on every save
+            _load_category_cached.cache_clear()
+            self._invalidate_index()
             return True
         except Exception as e:
             st.error(f"Error saving recipes: {e}")
             return False
     
+    def migrate_to_json(self) -> int:
+        """
+        Write JSON copies for every category up front (one-off, e.g. after
+        deploying) so no request pays for a YAML parse. Returns files written.
+        """
+        def migrate(file_path: Path) -> bool:
+            if not file_path.exists():
+                return False
+            
+            with open(file_path, 'r') as f:
+                recipes = yaml.load(f, Loader=SafeLoader) or []
+            _write_json_copy(file_path, file_path.stat().st_mtime_ns, recipes)
+            return True
+        
+        paths = [self.recipes_dir / f"{category}.yaml" for category in self.categories]
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            return sum(executor.map(migrate, paths))
+    
     def add_recipe(self, category: str, recipe: Dict) -> bool:
         """Add a new recipe to a category"""
-        recipes = self.load_recipes_from_category(category)
-        recipes.append(recipe)
-        return self.save_recipes_to_category(category, recipes)
+        return self.save_recipes_to_category(category, [recipe], append=True)
     
     def update_recipe(self, category: str, recipe_index: int, updated_recipe: Dict) -> bool:
         """Update an existing recipe"""
@@ -99,26 +284,182 @@ class RecipeManager:
         
         return False
     
+    def _category_signature(self) -> tuple:
+        """File versions the search index was built from"""
+        signature = []
+        for category in self.categories:
+            file_path = self.recipes_dir / f"{category}.yaml"
+            signature.append(file_path.stat().st_mtime_ns if file_path.exists() else 0)
+        return tuple(signature)
+    
+    def _write_combined(self) -> List[Dict]:
+        """
+        Rewrite _index.json from the category files
+        
+        The YAML files stay the source of truth (the planner and shopping
+        list read them); this is a flat cache so whole-collection reads are
+        one JSON load instead of one YAML parse per category.
+        """
+        signature = self._category_signature()
+        
+        # Categories are independent files - read them concurrently
+        # (file reads and libyaml parsing release the GIL)
+        paths = [self.recipes_dir / f"{category}.yaml" for category in self.categories]
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            loaded = list(executor.map(
+                lambda path, mtime_ns: _read_category(str(path), mtime_ns) if mtime_ns else [],
+                paths, signature
+            ))
+        
+        entries = [
+            {'category': category, 'index': idx, 'recipe': recipe, 'search': _search_text(recipe)}
+            for category, recipes in zip(self.categories, loaded)
+            for idx, recipe in enumerate(recipes)
+        ]
+        
+        try:
+            tmp_path = self.combined_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(_json_dumps({'signature': signature, 'recipes': entries}))
+            os.replace(tmp_path, self.combined_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not write {self.combined_path}: {e}")
+        
+        return entries
+    
+    def load_all_recipes(self) -> List[Dict]:
+        """
+        All recipes as [{'category', 'index', 'recipe', 'search'}, ...] in
+        category order ('search' is the lowercased text search_recipes matches)
+        
+        Read from _index.json; rebuilt first if any category file changed
+        since it was written.
+        """
+        try:
+            with open(self.combined_path, 'rb') as f:
+                combined = _json_loads(f.read())
+            if tuple(combined['signature']) == self._category_signature():
+                return combined['recipes']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # Missing or unreadable - rebuild below
+        
+        return self._write_combined()
+    
+    def _build_index(self) -> Dict:
+        """
+        Index every recipe's name and cuisine for search
+        
+        'entries' holds (category, index, recipe, search_text).
+        'fts' is an in-memory SQLite FTS5 table of every search_text (rowid =
+        entry position) with the trigram tokenizer, so any substring of 3+
+        characters is an index lookup; None if SQLite lacks FTS5.
+        'haystack' is every search_text joined by NUL, with 'offsets' giving
+        where each entry starts - for shorter queries, or without FTS5.
+        """
+        entries = [
+            (entry['category'], entry['index'], entry['recipe'],
+             entry.get('search') or _search_text(entry['recipe']))
+            for entry in self.load_all_recipes()
+        ]
+        
+        # Reruns of a session can land on different threads
+        fts = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            fts.execute("CREATE VIRTUAL TABLE recipes_fts USING fts5(search, tokenize='trigram')")
+            fts.executemany("INSERT INTO recipes_fts (rowid, search) VALUES (?, ?)",
+                            ((position, entry[3]) for position, entry in enumerate(entries)))
+        except sqlite3.OperationalError:
+            fts.close()
+            fts = None  # FTS5 (or its trigram tokenizer) not compiled in
+        
+        offsets = []
+        position = 0
+        for entry in entries:
+            offsets.append(position)
+            position += len(entry[3]) + 1
+        
+        return {
+            'signature': self._category_signature(),
+            'entries': entries,
+            'fts': fts,
+            'haystack': '\0'.join(entry[3] for entry in entries),
+            'offsets': offsets,
+            'results': OrderedDict()  # query -> results, LRU; dies with the index
+        }
+    
+    def _get_index(self) -> Dict:
+        """Search index, rebuilt only when a category file changes"""
+        signature = self._category_signature()
+        
+        with self._index_lock:
+            if self._index is None or self._index['signature'] != signature:
+                self._index = self._build_index()
+            return self._index
+    
+    def _invalidate_index(self):
+        """Forget the search index after recipes are written"""
+        with self._index_lock:
+            self._index = None
+    
+    @staticmethod
+    def _scan_haystack(index: Dict, query_lower: str) -> List[int]:
+        """Entry positions containing query_lower, via str.find over one joined string"""
+        haystack, offsets = index['haystack'], index['offsets']
+        positions = []
+        start = haystack.find(query_lower)
+        
+        while start != -1:
+            position = bisect.bisect_right(offsets, start) - 1
+            positions.append(position)
+            
+            # Continue from the next entry - one hit per recipe is enough
+            if position + 1 >= len(offsets):
+                break
+            start = haystack.find(query_lower, offsets[position + 1])
+        
+        return positions
+    
     def search_recipes(self, query: str) -> List[Dict]:
         """Search for recipes across all categories"""
-        results = []
-        query_lower = query.lower()
+        query_lower = query.strip().lower()
+        index = self._get_index()
+        entries = index['entries']
         
-        for category in self.categories:
-            recipes = self.load_recipes_from_category(category)
-            
-            for idx, recipe in enumerate(recipes):
-                name = recipe.get('name', '').lower()
-                cuisine = recipe.get('cuisine', '').lower()
-                
-                if query_lower in name or query_lower in cuisine:
-                    results.append({
-                        'category': category,
-                        'index': idx,
-                        'recipe': recipe
-                    })
-        
-        return results
+        with self._index_lock:
+            cached = index['results'].get(query_lower)
+            if cached is not None:
+                index['results'].move_to_end(query_lower)
+                return list(cached)
+        
+        # A quoted trigram query matches the text as a substring; queries
+        # under 3 characters have no trigrams, so they scan all recipes'
+        # text in one pass instead
+        if index['fts'] is not None and len(query_lower) >= 3:
+            phrase = '"' + query_lower.replace('"', '""') + '"'
+            rows = index['fts'].execute(
+                "SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH ? ORDER BY rowid", (phrase,)
+            ).fetchall()
+            positions = [p for (p,) in rows if query_lower in entries[p][3]]
+        else:
+            positions = self._scan_haystack(index, query_lower)
+        
+        results = [
+            {'category': category, 'index': idx, 'recipe': recipe}
+            for category, idx, recipe, _ in (entries[p] for p in positions)
+        ]
+        
+        with self._index_lock:
+            index['results'][query_lower] = results
+            if len(index['results']) > SEARCH_CACHE_SIZE:
+                index['results'].popitem(last=False)
+        
+        return list(results)
+
+
+@st.cache_resource
+def _get_manager() -> RecipeManager:
+    """One RecipeManager per process, so its search index survives reruns and sessions"""
+    return RecipeManager()
 
 
 def show_recipe_admin():
@@ -127,7 +468,7 @@ def show_recipe_admin():
     st.header("🍳 Recipe Management")
     st.caption("Add, edit, and manage your meal prep recipes")
     
-    manager = RecipeManager()
+    manager = _get_manager()
     
     # Tabs for different functions
     tab1, tab2, tab3, tab4 = st.tabs(["📚 Browse Recipes", "➕ Add Recipe", "✏️ Edit Recipe", "📋 Bulk Import"])
@@ -169,7 +510,7 @@ def show_recipe_admin():
         else:
             # Show by category
             category = st.selectbox("Select category to browse", manager.categories)
-            recipes = manager.load_recipes_from_category(category)
+            recipes = manager.get_recipes(category)
             
             if recipes:
                 st.write(f"**{len(recipes)} recipe(s) in {category}:**")
@@ -277,13 +618,15 @@ def show_recipe_admin():
         st.subheader("Edit Existing Recipe")
         
         category = st.selectbox("Select category", manager.categories, key="edit_category")
-        recipes = manager.load_recipes_from_category(category)
+        recipes = manager.get_recipes(category)
         
         if recipes:
-            recipe_names = [r['name'] for r in recipes]
-            selected_name = st.selectbox("Select recipe", recipe_names)
-            selected_index = recipe_names.index(selected_name)
+            # Options are positions, so duplicate names still pick the right recipe
+            selected_index = st.selectbox("Select recipe", range(len(recipes)),
+                                          format_func=lambda i: recipes[i]['name'],
+                                          key="edit_recipe_idx")
             selected_recipe = recipes[selected_index]
+            selected_name = selected_recipe['name']
             
             st.json(selected_recipe)
             
@@ -318,24 +661,25 @@ def show_recipe_admin():
         
         if st.button("📋 Import Recipes", type="primary"):
             try:
-                imported = yaml.safe_load(yaml_text)
+                imported = yaml.load(yaml_text, Loader=SafeLoader)
                 
                 if not isinstance(imported, list):
                     imported = [imported]
                 
                 # Validate each recipe has required fields
-                valid = True
-                for recipe in imported:
-                    if not all(k in recipe for k in ['name', 'servings']):
-                        st.error(f"Recipe missing required fields: {recipe.get('name', 'Unknown')}")
-                        valid = False
+                missing = [
+                    str(recipe.get('name', 'Unknown') if isinstance(recipe, dict) else recipe)
+                    for recipe in imported
+                    if not (isinstance(recipe, dict) and REQUIRED_RECIPE_FIELDS.issubset(recipe))
+                ]
                 
-                if valid:
-                    # Get existing recipes
-                    existing = manager.load_recipes_from_category(category)
-                    existing.extend(imported)
-                    
-                    if manager.save_recipes_to_category(category, existing):
+                if missing:
+                    more = f" (and {len(missing) - 5} more)" if len(missing) > 5 else ""
+                    st.error(f"Recipes missing required fields (name, servings): "
+                             f"{', '.join(missing[:5])}{more}")
+                else:
+                    # Added after the existing recipes
+                    if manager.save_recipes_to_category(category, imported, append=True):
                         st.success(f"✓ Imported {len(imported)} recipe(s) to {category}!")
                     else:
                         st.error("Failed to save recipes")
@@ -5,8 +5,71 @@ Collects preference data for future ML recommendations
 """
 
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, zip_longest
+from collections import deque
+
+from firebase_config import FIRESTORE_URL
+
+# Optional: faster JSON encoding (falls back to stdlib json)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# meal_type values for each tab ('lunch_dinner' lands in lunch)
+_BREAKFAST_TYPES = frozenset(('breakfast', 'morning', 'brunch'))
+_LUNCH_TYPES = frozenset(('lunch', 'midday', 'lunch_dinner'))
+_DINNER_TYPES = frozenset(('dinner', 'evening', 'lunch_dinner'))
+
+# Name fragments used when meal_type doesn't say
+_BREAKFAST_WORDS = ('oatmeal', 'pancake', 'hash', 'grits', 'breakfast')
+_LUNCH_WORDS = ('bowl', 'salad', 'wrap', 'sandwich')
+
+# Name keywords that suggest a cost tier, first match wins. Matched as
+# substrings like before ("eggs", "oatmeal"), one regex per tier
+_COST_TIER_PATTERNS = tuple(
+    (re.compile('|'.join(words)), tier)
+    for words, tier in (
+        (('salmon', 'beef', 'duck', 'lobster'), 'expensive'),
+        (('lentil', 'bean', 'rice', 'oat', 'egg'), 'cheap'),
+        (('chicken', 'turkey', 'pork'), 'budget_friendly'),
+    )
+)
+
+# Queued meal preferences sent to Firebase once this many build up,
+# whenever a plan is saved, and at most this many seconds after a selection
+PREF_FLUSH_SIZE = 10
+PREF_FLUSH_SECONDS = 30
+
+# One preference batch in flight at a time, so a recipe's writes land in order
+_pref_send_lock = threading.Lock()
+
+# Base cost per serving for each cost tier
+_TIER_COSTS = {
+    'very_cheap': 2.00,
+    'cheap': 3.00,
+    'budget_friendly': 4.00,
+    'medium': 5.50,
+    'expensive': 8.00,
+    'premium': 12.00
+}
+
+
+def _json_dumps(obj) -> str:
+    """Serialize to a JSON string (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
 
 
 def custom_plan_page():
@@ -20,18 +83,21 @@ def custom_plan_page():
         st.warning("Please log in to create custom meal plans.")
         return
     
+    # Get user profile for defaults
+    user_profile = st.session_state.user.get('profile', {})
+    
     # Initialize session state
     if 'custom_plan' not in st.session_state:
+        people = user_profile.get('household_size', 2)
         st.session_state.custom_plan = {
             'days': 7,
-            'people': 2,
-            'budget': 200,
-            'selected_meals': {},
+            'people': people,
+            'budget': calculate_default_budget(people, days=7),
+            'selected_meals': {},  # meal type -> recipe ids
             'preferences': []
         }
     
-    # Get user profile for defaults
-    user_profile = st.session_state.user.get('profile', {})
+    plan = st.session_state.custom_plan
     
     # ============================================================================
     # CONFIGURATION SECTION
@@ -40,41 +106,47 @@ def custom_plan_page():
     st.subheader("📊 Plan Configuration")
     
     with st.expander("⚙️ Setup Your Plan", expanded=True):
-        col1, col2, col3 = st.columns(3)
+        # A form, so changing all three values costs one rerun, not three;
+        # the inputs start from the plan's current values
+        for field in ('people', 'budget', 'days'):
+            st.session_state.setdefault(f"plan_{field}", plan[field])
         
-        with col1:
-            people = st.number_input(
-                "👥 People",
-                min_value=1,
-                max_value=10,
-                value=user_profile.get('household_size', 2),
-                help="How many people will be eating?"
-            )
-            st.session_state.custom_plan['people'] = people
-        
-        with col2:
-            # Calculate smart default budget based on people
-            default_budget = calculate_default_budget(people, days=7)
+        with st.form("plan_config"):
+            col1, col2, col3 = st.columns(3)
             
-            budget = st.number_input(
-                "💰 Budget ($)",
-                min_value=50,
-                max_value=2000,
-                value=default_budget,
-                step=25,
-                help="Total grocery budget for this plan"
-            )
-            st.session_state.custom_plan['budget'] = budget
+            with col1:
+                st.number_input(
+                    "👥 People",
+                    min_value=1,
+                    max_value=10,
+                    key="plan_people",
+                    help="How many people will be eating?"
+                )
+            
+            with col2:
+                st.number_input(
+                    "💰 Budget ($)",
+                    min_value=50,
+                    max_value=2000,
+                    step=25,
+                    key="plan_budget",
+                    help="Total grocery budget for this plan"
+                )
+            
+            with col3:
+                st.number_input(
+                    "📅 Days",
+                    min_value=3,
+                    max_value=21,
+                    key="plan_days",
+                    help="How many days to plan?"
+                )
+            
+            st.form_submit_button("Update Plan", on_click=_apply_plan_config)
         
-        with col3:
-            days = st.number_input(
-                "📅 Days",
-                min_value=3,
-                max_value=21,
-                value=7,
-                help="How many days to plan?"
-            )
-            st.session_state.custom_plan['days'] = days
+        people = plan['people']
+        budget = plan['budget']
+        days = plan['days']
         
         # Budget breakdown
         per_day = budget / days
@@ -105,35 +177,87 @@ def custom_plan_page():
     # Get available recipes
     recipes = load_recipes()
     
-    # Organize by meal type - be flexible with meal_type field
-    breakfast_recipes = []
-    lunch_recipes = []
-    dinner_recipes = []
+    # Organize by meal type (once per recipe list, see bucket_recipes)
+    breakfast_recipes, lunch_recipes, dinner_recipes = bucket_recipes(recipes)
     
-    for r in recipes:
-        meal_type = r.get('meal_type', '').lower()
+    # Debug info
+    st.caption(f"📊 Available: {len(breakfast_recipes)} breakfasts, {len(lunch_recipes)} lunches, {len(dinner_recipes)} dinners")
+    
+    # Picking meals reruns only this section (see _meal_selection)
+    _meal_selection(
+        (breakfast_recipes, lunch_recipes, dinner_recipes),
+        days,
+        people,
+        budget,
+        per_meal
+    )
+    
+    # ============================================================================
+    # SAVE PLAN SECTION
+    # ============================================================================
+    
+    st.divider()
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        plan_name = st.text_input(
+            "Plan Name",
+            value=f"Custom Plan - {datetime.now().strftime('%b %d, %Y')}",
+            help="Give your meal plan a name"
+        )
+    
+    with col2:
+        st.write("")  # Spacing
+        st.write("")
         
-        # Check multiple possible values for breakfast
-        if meal_type in ['breakfast', 'morning', 'brunch']:
-            breakfast_recipes.append(r)
-        # Check for lunch
-        elif meal_type in ['lunch', 'midday', 'lunch_dinner']:
-            lunch_recipes.append(r)
-        # Check for dinner
-        elif meal_type in ['dinner', 'evening', 'lunch_dinner']:
-            dinner_recipes.append(r)
-        # Fallback: check recipe name for clues
-        else:
-            name_lower = r['name'].lower()
-            if any(word in name_lower for word in ['oatmeal', 'pancake', 'hash', 'grits', 'breakfast']):
-                breakfast_recipes.append(r)
-            elif any(word in name_lower for word in ['bowl', 'salad', 'wrap', 'sandwich']):
-                lunch_recipes.append(r)
+        if st.button("💾 Save Custom Plan", type="primary", use_container_width=True):
+            selected_meals = st.session_state.custom_plan['selected_meals']
+            total_meals_needed = days * 3
+            total_meals_selected = sum(len(meals) for meals in selected_meals.values())
+            
+            if total_meals_selected < total_meals_needed:
+                st.error(f"Please select all {total_meals_needed} meals before saving!")
             else:
-                dinner_recipes.append(r)
+                save_custom_plan(
+                    plan_name,
+                    st.session_state.custom_plan,
+                    estimate_plan_cost(selected_meals, people, days),
+                    get_price_confidence(selected_meals)
+                )
+                st.success("✅ Custom plan saved successfully!")
+                st.balloons()
+                
+                # Navigate to plan view
+                st.session_state.page = 'meal_plan'
+                st.rerun()
+
+
+def _apply_plan_config():
+    """
+    Plan config form callback - runs before the rerun, so everything below
+    the form is drawn with the submitted values
+    """
+    plan = st.session_state.custom_plan
+    people = st.session_state.plan_people
+    budget = st.session_state.plan_budget
     
-    # Debug info
-    st.caption(f"📊 Available: {len(breakfast_recipes)} breakfasts, {len(lunch_recipes)} lunches, {len(dinner_recipes)} dinners")
+    # Budget left as is follows the household size (smart default)
+    if budget == plan['budget'] and people != plan['people']:
+        budget = st.session_state.plan_budget = calculate_default_budget(people, days=7)
+    
+    plan.update(people=people, budget=budget, days=st.session_state.plan_days)
+
+
+@st.fragment
+def _meal_selection(meal_buckets, days, people, budget, per_meal):
+    """
+    Progress, meal pickers and cost estimate
+    
+    A fragment, so adding or removing a meal reruns just this part of the
+    page rather than the configuration and recipe loading above it.
+    """
+    breakfast_recipes, lunch_recipes, dinner_recipes = meal_buckets
     
     # Track total meals needed
     total_meals_needed = days * 3
@@ -144,38 +268,30 @@ def custom_plan_page():
     st.progress(progress)
     st.caption(f"Selected {total_meals_selected} of {total_meals_needed} meals ({progress*100:.0f}%)")
     
-    # Meal selection tabs
-    tab1, tab2, tab3 = st.tabs(["🌅 Breakfast", "🌞 Lunch", "🌙 Dinner"])
-    
-    with tab1:
-        st.write(f"**Select {days} Breakfasts**")
-        selected_breakfasts = meal_selector(
-            breakfast_recipes,
-            "breakfast",
-            days,
-            people,
-            per_meal
-        )
-    
-    with tab2:
-        st.write(f"**Select {days} Lunches**")
-        selected_lunches = meal_selector(
-            lunch_recipes,
-            "lunch",
-            days,
-            people,
-            per_meal
-        )
-    
-    with tab3:
-        st.write(f"**Select {days} Dinners**")
-        selected_dinners = meal_selector(
-            dinner_recipes,
-            "dinner",
-            days,
-            people,
-            per_meal
-        )
+    # Meal selection - a radio rather than st.tabs, so only the chosen
+    # meal type's cards are built on each rerun
+    meal_tabs = {
+        "🌅 Breakfast": ("breakfast", "Breakfasts", breakfast_recipes),
+        "🌞 Lunch": ("lunch", "Lunches", lunch_recipes),
+        "🌙 Dinner": ("dinner", "Dinners", dinner_recipes),
+    }
+    active_tab = st.radio(
+        "Meal",
+        list(meal_tabs),
+        horizontal=True,
+        key="active_meal_tab",
+        label_visibility="collapsed"
+    )
+    meal_type, meal_label, meal_recipes = meal_tabs[active_tab]
+    
+    st.write(f"**Select {days} {meal_label}**")
+    meal_selector(
+        meal_recipes,
+        meal_type,
+        days,
+        people,
+        per_meal
+    )
     
     # ============================================================================
     # COST ESTIMATION SECTION
@@ -210,42 +326,6 @@ def custom_plan_page():
         with col3:
             confidence = get_price_confidence(st.session_state.custom_plan['selected_meals'])
             st.metric("Price Confidence", f"{confidence}%")
-    
-    # ============================================================================
-    # SAVE PLAN SECTION
-    # ============================================================================
-    
-    st.divider()
-    
-    col1, col2 = st.columns([3, 1])
-    
-    with col1:
-        plan_name = st.text_input(
-            "Plan Name",
-            value=f"Custom Plan - {datetime.now().strftime('%b %d, %Y')}",
-            help="Give your meal plan a name"
-        )
-    
-    with col2:
-        st.write("")  # Spacing
-        st.write("")
-        
-        if st.button("💾 Save Custom Plan", type="primary", use_container_width=True):
-            if total_meals_selected < total_meals_needed:
-                st.error(f"Please select all {total_meals_needed} meals before saving!")
-            else:
-                save_custom_plan(
-                    plan_name,
-                    st.session_state.custom_plan,
-                    estimated_cost,
-                    confidence
-                )
-                st.success("✅ Custom plan saved successfully!")
-                st.balloons()
-                
-                # Navigate to plan view
-                st.session_state.page = 'meal_plan'
-                st.rerun()
 
 
 def meal_selector(recipes, meal_type, days, people, budget_per_meal):
@@ -255,12 +335,14 @@ def meal_selector(recipes, meal_type, days, people, budget_per_meal):
     if meal_type not in st.session_state.custom_plan['selected_meals']:
         st.session_state.custom_plan['selected_meals'][meal_type] = []
     
+    # Recipe ids - looked up in recipes_by_id to display
     selected = st.session_state.custom_plan['selected_meals'][meal_type]
+    by_id = recipes_by_id()
     
     # Show already selected meals
     if selected:
         st.write("**Selected:**")
-        for i, meal in enumerate(selected):
+        for i, meal in enumerate(_resolve_selected(selected, by_id)):
             col1, col2, col3 = st.columns([3, 1, 1])
             with col1:
                 st.write(f"{i+1}. {meal['name']}")
@@ -271,21 +353,32 @@ def meal_selector(recipes, meal_type, days, people, budget_per_meal):
                 else:
                     st.write(f"⚠️ ${est_cost:.2f}")
             with col3:
-                if st.button("❌", key=f"remove_{meal_type}_{i}"):
-                    selected.pop(i)
-                    st.rerun()
+                st.button("❌", key=f"remove_{meal_type}_{i}", on_click=selected.pop, args=(i,))
     
     # Add new meal
     if len(selected) < days:
         st.write("**Add Meal:**")
         
-        # Filter out already selected
-        available = [r for r in recipes if r not in selected]
+        # Filter out already selected, stopping once the current page of
+        # cards is filled
+        selected_ids = set(selected)
+        page_key = f"{meal_type}_page"
+        page = st.session_state.get(page_key, 0)
+        
+        def card_page(page):
+            unselected = (r for r in recipes if r['id'] not in selected_ids)
+            return list(islice(unselected, page * 6, (page + 1) * 6))
+        
+        available = card_page(page)
+        if not available and page:
+            # Paged past the end (or selections shrank the list) - wrap around
+            page = st.session_state[page_key] = 0
+            available = card_page(page)
         
         if available:
             # Show recipe cards
             cols = st.columns(3)
-            for i, recipe in enumerate(available[:6]):  # Show 6 at a time
+            for i, recipe in enumerate(available):  # Show 6 at a time
                 with cols[i % 3]:
                     with st.container(border=True):
                         st.write(f"**{recipe['name']}**")
@@ -300,24 +393,47 @@ def meal_selector(recipes, meal_type, days, people, budget_per_meal):
                         # Show key info
                         st.caption(f"⏱️ {recipe.get('prep_time', 'N/A')} min")
                         
-                        if st.button("➕ Add", key=f"add_{meal_type}_{i}", use_container_width=True):
-                            selected.append(recipe)
-                            
-                            # Track preference for ML
-                            track_meal_preference(
-                                st.session_state.user['user_id'],  # Fixed: was 'uid'
-                                recipe['id'],
-                                'manual_selection',
-                                {'budget_per_meal': budget_per_meal, 'people': people}
-                            )
-                            
-                            st.rerun()
+                        st.button(
+                            "➕ Add",
+                            key=f"add_{meal_type}_{i}",
+                            use_container_width=True,
+                            on_click=_add_meal,
+                            args=(selected, recipe, budget_per_meal, people)
+                        )
+            
+            st.button(
+                "🔄 More options",
+                key=f"more_{meal_type}",
+                on_click=_set_state,
+                args=(page_key, page + 1)
+            )
     else:
         st.success(f"✅ All {days} {meal_type}s selected!")
     
     return selected
 
 
+def _add_meal(selected, recipe, budget_per_meal, people):
+    """
+    Add button callback - runs before the rerun, so the cards it draws
+    already reflect the new selection
+    """
+    selected.append(recipe['id'])
+    
+    # Track preference for ML
+    track_meal_preference(
+        st.session_state.user['user_id'],  # Fixed: was 'uid'
+        recipe['id'],
+        'manual_selection',
+        {'budget_per_meal': budget_per_meal, 'people': people}
+    )
+
+
+def _set_state(key, value):
+    """Button callback that stores a value in session state"""
+    st.session_state[key] = value
+
+
 def calculate_default_budget(people, days=7):
     """
     Calculate smart default budget based on household size
@@ -339,46 +455,51 @@ def calculate_default_budget(people, days=7):
     return round(total_budget / 25) * 25
 
 
+def _efficiency(people):
+    """
+    Per-person cost factor - larger households buy in bulk
+    """
+    if people <= 2:
+        return 1.0
+    elif people <= 4:
+        return 0.9
+    return 0.85
+
+
 def estimate_meal_cost(recipe, people):
     """
     Estimate cost of a single meal for given number of people
     """
-    # Get cost tier from recipe
-    tier = recipe.get('cost_tier', 'medium')
-    
-    # Base cost per serving
-    tier_costs = {
-        'very_cheap': 2.00,
-        'cheap': 3.00,
-        'budget_friendly': 4.00,
-        'medium': 5.50,
-        'expensive': 8.00,
-        'premium': 12.00
-    }
-    
-    base_cost = tier_costs.get(tier, 5.00)
+    base_cost = _TIER_COSTS.get(recipe.get('cost_tier', 'medium'), 5.00)
     
     # Scale by people (with efficiency factor)
-    if people <= 2:
-        efficiency = 1.0
-    elif people <= 4:
-        efficiency = 0.9
-    else:
-        efficiency = 0.85
-    
-    return base_cost * people * efficiency
+    return base_cost * people * _efficiency(people)
 
 
 def estimate_plan_cost(selected_meals, people, days):
     """
     Estimate total cost for entire plan
     """
-    total = 0
-    for meal_type, meals in selected_meals.items():
-        for meal in meals:
-            total += estimate_meal_cost(meal, people)
-    
-    return total
+    by_id = recipes_by_id()
+    
+    # Cost depends only on which tiers were picked, so the sum is cached
+    # on the sorted tiers - reruns with the same selection skip it
+    tiers = tuple(sorted(
+        meal.get('cost_tier', 'medium')
+        for meal_ids in selected_meals.values()
+        for meal in _resolve_selected(meal_ids, by_id)
+    ))
+    return _cost_for_tiers(tiers, people)
+
+
+@lru_cache(maxsize=128)
+def _cost_for_tiers(tiers, people):
+    """
+    Total cost of meals with the given cost tiers
+    """
+    # Same scale for every meal, so sum the per-serving costs once
+    base_total = sum(_TIER_COSTS.get(tier, 5.00) for tier in tiers)
+    return base_total * people * _efficiency(people)
 
 
 def get_price_confidence(selected_meals):
@@ -393,36 +514,168 @@ def get_price_confidence(selected_meals):
 def track_meal_preference(user_id, recipe_id, selection_context, metadata):
     """
     Track user meal selections for future ML recommendations
+    
+    Selections are queued in session state and sent together by
+    _flush_preferences, so an Add click doesn't wait on Firestore.
     """
-    try:
-        import requests
-        from firebase_config import FIRESTORE_URL
-        
-        # Get ID token from session
-        id_token = st.session_state.user.get('id_token')
-        if not id_token:
+    queue = st.session_state.setdefault('_pref_queue', deque())
+    queue.append({
+        'user_id': user_id,
+        'recipe_id': recipe_id,
+        'selected_at': datetime.now().isoformat() + 'Z',
+        'context': selection_context,
+        'metadata': metadata
+    })
+    
+    if len(queue) >= PREF_FLUSH_SIZE:
+        _flush_preferences()
+    else:
+        _schedule_preference_flush(queue)
+
+
+@st.cache_resource
+def _firebase_session():
+    """
+    HTTP session for Firestore calls, shared across reruns and sessions so
+    connections are kept alive instead of re-handshaking per request
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
+
+@st.cache_resource
+def _tracking_executor():
+    """
+    Background threads for preference tracking, shared across sessions
+    """
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="pref-tracking")
+
+
+@st.cache_resource
+def _get_planner():
+    """Shared MealPlanner - config and recipe files read once per process"""
+    from meal_planner import MealPlanner
+    return MealPlanner()
+
+
+@st.cache_resource
+def _get_shopping_generator():
+    """Shared ShoppingListGenerator - config, recipes and store map read once per process"""
+    from shopping_list import ShoppingListGenerator
+    return ShoppingListGenerator()
+
+
+def _flush_preferences():
+    """
+    Send queued meal preferences to Firebase in one batchWrite
+    """
+    queue = st.session_state.get('_pref_queue')
+    id_token = st.session_state.user.get('id_token')
+    if not queue or not id_token:
+        return
+    
+    # Sent from a worker thread so the rerun doesn't wait on the network
+    # (nothing on the page depends on the result)
+    _tracking_executor().submit(_send_preferences, _firebase_session(), queue, id_token)
+
+
+def _schedule_preference_flush(queue):
+    """
+    Send whatever is still queued after PREF_FLUSH_SECONDS - the timer
+    outlives the session, so selections go out even if the user never saves
+    """
+    timer = st.session_state.get('_pref_timer')
+    id_token = st.session_state.user.get('id_token')
+    if (timer is not None and timer.is_alive()) or not id_token:
+        return
+    
+    timer = threading.Timer(PREF_FLUSH_SECONDS, _send_preferences,
+                            args=(_firebase_session(), queue, id_token))
+    timer.daemon = True
+    timer.start()
+    st.session_state['_pref_timer'] = timer
+
+
+def _send_preferences(session, queue, id_token):
+    """
+    Drain a preference queue into one batchWrite (worker/timer thread - no
+    Streamlit calls). Writes that fail go back on the front of the queue and
+    are retried by the next flush.
+    """
+    with _pref_send_lock:
+        prefs = []
+        while queue:
+            try:
+                prefs.append(queue.popleft())
+            except IndexError:
+                break
+        if not prefs:
             return
         
-        preference_data = {
-            'recipe_id': {'stringValue': recipe_id},
-            'selected_at': {'timestampValue': datetime.now().isoformat() + 'Z'},
-            'context': {'stringValue': selection_context},
-            'metadata': {'stringValue': json.dumps(metadata)}
-        }
+        # batchWrite rejects the whole batch if two writes touch one document:
+        # keep only the latest selection of each recipe
+        documents_root = FIRESTORE_URL.split('/v1/', 1)[1]
+        latest = {}
+        for pref in prefs:
+            name = f"{documents_root}/users/{pref['user_id']}/meal_preferences/{pref['recipe_id']}"
+            latest.pop(name, None)
+            latest[name] = pref
+        batch = list(latest.values())
         
-        # Save to Firebase
-        url = f"{FIRESTORE_URL}/users/{user_id}/meal_preferences/{recipe_id}"
-        headers = {"Authorization": f"Bearer {id_token}"}
+        writes = [
+            {
+                'update': {
+                    'name': name,
+                    'fields': {
+                        'recipe_id': {'stringValue': pref['recipe_id']},
+                        'selected_at': {'timestampValue': pref['selected_at']},
+                        'context': {'stringValue': pref['context']},
+                        'metadata': {'stringValue': _json_dumps(pref['metadata'])}
+                    }
+                }
+            }
+            for name, pref in latest.items()
+        ]
         
-        requests.patch(
-            url,
-            json={"fields": preference_data},
-            headers=headers,
-            timeout=2
-        )
+        try:
+            response = session.post(
+                f"{FIRESTORE_URL}:batchWrite",
+                json={"writes": writes},
+                headers={"Authorization": f"Bearer {id_token}"},
+                timeout=5
+            )
+        except requests.RequestException as e:
+            print(f"Error tracking preferences: {e}")
+            failed = batch
+        else:
+            if response.status_code == 200:
+                # One status per write; a non-zero code means that write failed
+                try:
+                    statuses = response.json().get('status', [])
+                except ValueError:
+                    statuses = []
+                failed = [pref for pref, status in zip(batch, statuses) if status.get('code', 0)]
+            else:
+                print(f"Error tracking preferences: {response.status_code} {response.text[:200]}")
+                failed = batch
         
-    except Exception as e:
-        print(f"Error tracking preference: {e}")
+        if failed:
+            # Ahead of anything queued meanwhile, so newer selections still win
+            queue.extendleft(reversed(failed))
+
+
+def _plan_meal(recipe):
+    """
+    A recipe as a saved plan's meal entry (None for no recipe)
+    """
+    if not recipe:
+        return None
+    return {
+        'recipe': recipe['name'],
+        'cuisine': recipe.get('cuisine', ''),
+        'time': f"{recipe.get('prep_time', 0)} min"
+    }
 
 
 def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
@@ -430,10 +683,6 @@ def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
     Save custom plan to Firebase in the format the app expects
     """
     try:
-        import requests
-        from firebase_config import FIRESTORE_URL
-        from datetime import timedelta
-        
         user_id = st.session_state.user['user_id']
         id_token = st.session_state.user.get('id_token')
         
@@ -441,61 +690,45 @@ def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
             st.error("Authentication required to save plan")
             return
         
+        # Send any meal selections still queued for tracking
+        _flush_preferences()
+        
         # Get start date
         start_date = datetime.now()
         
         # Build meal plan in the format your app expects
         days_list = []
         
-        for day_num in range(1, plan_data['days'] + 1):
-            current_date = start_date + timedelta(days=day_num - 1)
-            
-            # Get meals for this day
-            breakfast = None
-            lunch = None
-            dinner = None
-            
-            # Get from selected meals
-            breakfasts = plan_data['selected_meals'].get('breakfast', [])
-            lunches = plan_data['selected_meals'].get('lunch', [])
-            dinners = plan_data['selected_meals'].get('dinner', [])
-            
-            if day_num <= len(breakfasts):
-                breakfast_recipe = breakfasts[day_num - 1]
-                breakfast = {
-                    'recipe': breakfast_recipe['name'],
-                    'cuisine': breakfast_recipe.get('cuisine', ''),
-                    'time': f"{breakfast_recipe.get('prep_time', 0)} min"
-                }
-            
-            if day_num <= len(lunches):
-                lunch_recipe = lunches[day_num - 1]
-                lunch = {
-                    'recipe': lunch_recipe['name'],
-                    'cuisine': lunch_recipe.get('cuisine', ''),
-                    'time': f"{lunch_recipe.get('prep_time', 0)} min"
-                }
-            
-            if day_num <= len(dinners):
-                dinner_recipe = dinners[day_num - 1]
-                dinner = {
-                    'recipe': dinner_recipe['name'],
-                    'cuisine': dinner_recipe.get('cuisine', ''),
-                    'time': f"{dinner_recipe.get('prep_time', 0)} min"
-                }
+        # Get from selected meals (stored as recipe ids)
+        by_id = recipes_by_id()
+        breakfasts = _resolve_selected(plan_data['selected_meals'].get('breakfast', []), by_id)
+        lunches = _resolve_selected(plan_data['selected_meals'].get('lunch', []), by_id)
+        dinners = _resolve_selected(plan_data['selected_meals'].get('dinner', []), by_id)
+        
+        # One pass over the days, meals paired up by position (None once a
+        # list runs out); range() comes first so it sets the number of days
+        current_date = start_date
+        one_day = timedelta(days=1)
+        
+        for day_idx, breakfast_recipe, lunch_recipe, dinner_recipe in zip_longest(
+                range(plan_data['days']), breakfasts, lunches, dinners):
+            if day_idx is None:
+                break
+            day_num = day_idx + 1
             
             day_info = {
                 'day': day_num,
                 'day_name': current_date.strftime('%A'),
                 'date': current_date.strftime('%m/%d/%Y'),
                 'meals': {
-                    'breakfast': breakfast,
-                    'lunch': lunch,
-                    'dinner': dinner
+                    'breakfast': _plan_meal(breakfast_recipe),
+                    'lunch': _plan_meal(lunch_recipe),
+                    'dinner': _plan_meal(dinner_recipe)
                 }
             }
             
             days_list.append(day_info)
+            current_date += one_day
         
         # Build complete meal plan
         meal_plan = {
@@ -512,19 +745,22 @@ def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
         
         # Save to Firebase (simplified - just save the whole thing as JSON string)
         url = f"{FIRESTORE_URL}/users/{user_id}"
-        headers = {"Authorization": f"Bearer {id_token}"}
+        headers = {
+            "Authorization": f"Bearer {id_token}",
+            "Content-Type": "application/json"
+        }
         
         firebase_data = {
             'fields': {
                 'meal_plan': {
-                    'stringValue': json.dumps(meal_plan)
+                    'stringValue': _json_dumps(meal_plan)
                 }
             }
         }
         
-        response = requests.patch(
+        response = _firebase_session().patch(
             url,
-            json=firebase_data,
+            data=_json_dumps(firebase_data).encode(),  # Already serialized - skip requests' json
             headers=headers,
             timeout=5
         )
@@ -537,15 +773,12 @@ def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
             
             # Generate shopping list with selected stores
             try:
-                from shopping_list import ShoppingListGenerator
-                from meal_planner import MealPlanner
-                
                 # Get user's selected stores from session state
                 selected_stores = st.session_state.get('selected_stores', ['costco', 'whole_foods', 'petes_fresh_market'])
                 
-                # Initialize planner and shopping list generator
-                planner = MealPlanner()
-                shopping_gen = ShoppingListGenerator()
+                # Shared planner and shopping list generator (recipes loaded once)
+                planner = _get_planner()
+                shopping_gen = _get_shopping_generator()
                 
                 # Generate shopping list
                 shopping_list = shopping_gen.generate_list(meal_plan, planner.recipes)
@@ -572,21 +805,121 @@ def save_custom_plan(plan_name, plan_data, estimated_cost, confidence):
 def load_recipes():
     """
     Load available recipes from session state
+    
+    The flattened list is kept in session state alongside the recipes dict
+    it came from, so reruns reuse it until st.session_state.recipes is
+    replaced.
     """
-    if 'recipes' in st.session_state:
-        # Flatten the recipes dictionary into a list
-        all_recipes = []
-        for category, recipe_list in st.session_state.recipes.items():
-            for recipe in recipe_list:
-                # Add cost tier if not present (based on simple heuristics)
-                if 'cost_tier' not in recipe:
-                    recipe['cost_tier'] = estimate_cost_tier(recipe)
-                # Add ID if not present
-                if 'id' not in recipe:
-                    recipe['id'] = recipe['name'].lower().replace(' ', '_')
-                all_recipes.append(recipe)
-        return all_recipes
-    return []
+    if 'recipes' not in st.session_state:
+        return []
+    
+    recipes = st.session_state.recipes
+    cached = st.session_state.get('_custom_plan_recipes')
+    
+    # Compared by identity - the cache holds a reference, so it can't be reused
+    if cached is None or cached[0] is not recipes:
+        cached = (recipes, _flatten_recipes(recipes))
+        st.session_state['_custom_plan_recipes'] = cached
+    
+    return cached[1]
+
+
+def _flatten_recipes(recipes):
+    """
+    Flatten the recipes dictionary into a list
+    """
+    all_recipes = []
+    seen_ids = set()
+    for category, recipe_list in recipes.items():
+        for recipe in recipe_list:
+            # Add cost tier if not present (based on simple heuristics)
+            if 'cost_tier' not in recipe:
+                recipe['cost_tier'] = estimate_cost_tier(recipe)
+            # Add ID if not present - prefixed with the category since names
+            # repeat across categories, and numbered if one still repeats
+            if 'id' not in recipe:
+                base_id = f"{category}_{recipe['name'].lower().replace(' ', '_')}"
+                recipe_id = base_id
+                n = 2
+                while recipe_id in seen_ids:
+                    recipe_id = f"{base_id}_{n}"
+                    n += 1
+                recipe['id'] = recipe_id
+            seen_ids.add(recipe['id'])
+            all_recipes.append(recipe)
+    return all_recipes
+
+
+def recipes_by_id():
+    """
+    Recipes keyed by id (first recipe wins for a repeated id)
+    
+    Kept in session state with the list it came from, like bucket_recipes.
+    """
+    recipes = load_recipes()
+    cached = st.session_state.get('_custom_plan_by_id')
+    if cached is not None and cached[0] is recipes:
+        return cached[1]
+    
+    by_id = {}
+    for recipe in recipes:
+        by_id.setdefault(recipe['id'], recipe)
+    
+    st.session_state['_custom_plan_by_id'] = (recipes, by_id)
+    return by_id
+
+
+def _resolve_selected(meal_ids, by_id):
+    """
+    Recipes for a list of selected ids
+    
+    Ids that no longer resolve (recipes reloaded or renamed) are pruned
+    from meal_ids in place, so the selection stays in step with what's shown.
+    """
+    meals = [by_id.get(meal_id) for meal_id in meal_ids]
+    if None in meals:
+        meal_ids[:] = [meal_id for meal_id, meal in zip(meal_ids, meals) if meal is not None]
+        meals = [meal for meal in meals if meal is not None]
+    return meals
+
+
+def bucket_recipes(recipes):
+    """
+    Split recipes into (breakfasts, lunches, dinners)
+    
+    Kept in session state with the list it came from, so reruns skip the
+    split until load_recipes returns a new list.
+    """
+    cached = st.session_state.get('_custom_plan_buckets')
+    if cached is not None and cached[0] is recipes:
+        return cached[1]
+    
+    breakfast_recipes = []
+    lunch_recipes = []
+    dinner_recipes = []
+    
+    for r in recipes:
+        meal_type = r.get('meal_type', '').lower()
+        
+        if meal_type in _BREAKFAST_TYPES:
+            breakfast_recipes.append(r)
+        elif meal_type in _LUNCH_TYPES:
+            lunch_recipes.append(r)
+        elif meal_type in _DINNER_TYPES:
+            dinner_recipes.append(r)
+        # Fallback: check recipe name for clues
+        else:
+            name_lower = r['name'].lower()
+            if any(word in name_lower for word in _BREAKFAST_WORDS):
+                breakfast_recipes.append(r)
+            elif any(word in name_lower for word in _LUNCH_WORDS):
+                lunch_recipes.append(r)
+            else:
+                dinner_recipes.append(r)
+    
+    buckets = (breakfast_recipes, lunch_recipes, dinner_recipes)
+    st.session_state['_custom_plan_buckets'] = (recipes, buckets)
+    return buckets
 
 
 def estimate_cost_tier(recipe):
@@ -595,17 +928,10 @@ def estimate_cost_tier(recipe):
     """
     name_lower = recipe['name'].lower()
     
-    # Check for expensive ingredients
-    if any(word in name_lower for word in ['salmon', 'beef', 'duck', 'lobster']):
-        return 'expensive'
-    
-    # Check for cheap ingredients  
-    if any(word in name_lower for word in ['lentil', 'bean', 'rice', 'oat', 'egg']):
-        return 'cheap'
-    
-    # Check for budget-friendly proteins
-    if any(word in name_lower for word in ['chicken', 'turkey', 'pork']):
-        return 'budget_friendly'
+    # Checked in order: expensive, cheap, then budget-friendly proteins
+    for pattern, tier in _COST_TIER_PATTERNS:
+        if pattern.search(name_lower):
+            return tier
     
     # Default to medium
     return 'medium'
@@ -4,19 +4,62 @@ Excel Export Module
 Exports shopping lists to Excel with separate sheets per store
 """
 
+import os
 import yaml
+import importlib.util
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, BinaryIO, List, Optional, Tuple
 
-try:
+from multi_format_export import _flatten, _pretty_store
+
+# Detected without importing: openpyxl and the shared styles load on the
+# first ExcelExporter(), so CSV/SMS/JSON-only callers never pay for them
+OPENPYXL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+if not OPENPYXL_AVAILABLE:
+    print("Warning: openpyxl not installed. Install with: pip install openpyxl --break-system-packages")
+
+# Write buffer for saved workbooks (bytes); tune per deployment
+XLSX_BUFFER_SIZE = int(os.getenv('MEAL_PREP_XLSX_BUFFER', 1 << 20))
+
+_OPENPYXL_LOADED = False
+
+
+def _load_openpyxl() -> None:
+    """Import openpyxl and build the module-level shared styles (first call only)"""
+    global _OPENPYXL_LOADED, Workbook, WriteOnlyCell, Font, PatternFill, Alignment
+    global HEADER_FILL, HEADER_FONT, STORE_HEADER_FILL, STORE_HEADER_FONT, STORE_TITLE_FONT
+    global CHECKLIST_FILL, TITLE_FONT, SHEET_TITLE_FONT, SECTION_FONT, BOLD_FONT, ITALIC_FONT
+    global CENTER, CENTER_MIDDLE, LEFT_MIDDLE, THIN_BORDER
+    if _OPENPYXL_LOADED:
+        return
+    
     from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
-    print("Warning: openpyxl not installed. Install with: pip install openpyxl --break-system-packages")
+    
+    # Shared styles - one instance each for every cell in every workbook
+    HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    HEADER_FONT = Font(color="FFFFFF", bold=True, size=12)
+    STORE_HEADER_FILL = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+    STORE_HEADER_FONT = Font(color="FFFFFF", bold=True, size=11)
+    STORE_TITLE_FONT = Font(color="FFFFFF", bold=True, size=14)
+    CHECKLIST_FILL = PatternFill(start_color="FFD966", end_color="FFD966", fill_type="solid")
+    TITLE_FONT = Font(bold=True, size=16)
+    SHEET_TITLE_FONT = Font(bold=True, size=14)
+    SECTION_FONT = Font(bold=True, size=12)
+    BOLD_FONT = Font(bold=True)
+    ITALIC_FONT = Font(italic=True)
+    CENTER = Alignment(horizontal='center')
+    CENTER_MIDDLE = Alignment(horizontal='center', vertical='center')
+    LEFT_MIDDLE = Alignment(horizontal='left', vertical='center')
+    THIN_BORDER = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    _OPENPYXL_LOADED = True
 
 
 class ExcelExporter:
@@ -24,31 +67,49 @@ class ExcelExporter:
         """Initialize Excel exporter"""
         if not OPENPYXL_AVAILABLE:
             raise ImportError("openpyxl is required. Install with: pip install openpyxl --break-system-packages")
+        _load_openpyxl()
         
         # Define styles
-        self.header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        self.header_font = Font(color="FFFFFF", bold=True, size=12)
-        self.store_header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        self.store_header_font = Font(color="FFFFFF", bold=True, size=11)
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        self.header_fill = HEADER_FILL
+        self.header_font = HEADER_FONT
+        self.store_header_fill = STORE_HEADER_FILL
+        self.store_header_font = STORE_HEADER_FONT
+        self.border = THIN_BORDER
+    
+    @staticmethod
+    def _cell(ws, value=None, font=None, fill=None, border=None, alignment=None) -> 'WriteOnlyCell':
+        """Styled cell for appending to a write-only sheet"""
+        cell = WriteOnlyCell(ws, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if border is not None:
+            cell.border = border
+        if alignment is not None:
+            cell.alignment = alignment
+        return cell
     
-    def _create_summary_sheet(self, wb: Workbook, shopping_list: Dict) -> None:
+    @classmethod
+    def _cells(cls, ws, values, font=None, fill=None, border=None, alignment=None) -> List['WriteOnlyCell']:
+        """One row of cells sharing the same style objects"""
+        return [cls._cell(ws, value, font, fill, border, alignment) for value in values]
+    
+    def _create_summary_sheet(self, wb: 'Workbook', shopping_list: Dict) -> None:
         """Create overview summary sheet"""
-        ws = wb.active
-        ws.title = "Summary"
+        ws = wb.create_sheet(title="Summary")
+        
+        # Write-only sheets take column widths before any rows
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 20
+        ws.column_dimensions['C'].width = 15
         
         # Title
-        ws['A1'] = "Bi-Weekly Shopping List"
-        ws['A1'].font = Font(bold=True, size=16)
-        ws['A1'].alignment = Alignment(horizontal='left', vertical='center')
+        ws.append([self._cell(ws, "Bi-Weekly Shopping List", font=TITLE_FONT,
+                              alignment=LEFT_MIDDLE)])
+        ws.append([])
         
         # Key info
-        row = 3
         info = [
             ("Planning Period:", shopping_list['meal_plan_dates']),
             ("People:", shopping_list['people']),
@@ -57,156 +118,106 @@ class ExcelExporter:
         ]
         
         for label, value in info:
-            ws[f'A{row}'] = label
-            ws[f'A{row}'].font = Font(bold=True)
-            ws[f'B{row}'] = value
-            row += 1
+            ws.append([self._cell(ws, label, font=BOLD_FONT), value])
         
         # Store breakdown
-        row += 2
-        ws[f'A{row}'] = "Stores to Visit:"
-        ws[f'A{row}'].font = Font(bold=True, size=12)
-        row += 1
-        
-        ws[f'A{row}'] = "Store"
-        ws[f'B{row}'] = "Type"
-        ws[f'C{row}'] = "Items"
-        for col in ['A', 'B', 'C']:
-            ws[f'{col}{row}'].fill = self.header_fill
-            ws[f'{col}{row}'].font = self.header_font
-            ws[f'{col}{row}'].border = self.border
-        row += 1
+        ws.append([])
+        ws.append([])
+        ws.append([self._cell(ws, "Stores to Visit:", font=SECTION_FONT)])
+        
+        ws.append(self._cells(ws, ("Store", "Type", "Items"),
+                              font=self.header_font, fill=self.header_fill, border=self.border))
         
         for store_name, store_data in shopping_list['stores'].items():
-            ws[f'A{row}'] = store_name.replace('_', ' ').title()
-            ws[f'B{row}'] = store_data['store_info'].get('type', 'N/A').title()
-            ws[f'C{row}'] = len(store_data['items'])
-            for col in ['A', 'B', 'C']:
-                ws[f'{col}{row}'].border = self.border
-            row += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 15
+            ws.append(self._cells(ws, (
+                _pretty_store(store_name),
+                store_data['store_info'].get('type', 'N/A').title(),
+                len(store_data['items'])
+            ), border=self.border))
     
-    def _create_store_sheet(self, wb: Workbook, store_name: str, store_data: Dict) -> None:
+    def _create_store_sheet(self, wb: 'Workbook', store_name: str, store_data: Dict) -> None:
         """Create individual sheet for each store"""
         # Clean store name for sheet title
-        sheet_title = store_name.replace('_', ' ').title()[:31]  # Excel limit
+        sheet_title = _pretty_store(store_name)[:31]  # Excel limit
         ws = wb.create_sheet(title=sheet_title)
         
+        # Column widths (set before any rows - write-only sheet)
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 12
+        ws.column_dimensions['C'].width = 12
+        ws.column_dimensions['D'].width = 40
+        ws.column_dimensions['E'].width = 12
+        
         # Store header
-        ws['A1'] = sheet_title
-        ws['A1'].font = Font(bold=True, size=14)
-        ws['A1'].fill = self.store_header_fill
-        ws['A1'].font = Font(color="FFFFFF", bold=True, size=14)
-        ws.merge_cells('A1:D1')
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
+        ws.append([self._cell(ws, sheet_title, font=STORE_TITLE_FONT,
+                              fill=self.store_header_fill,
+                              alignment=CENTER_MIDDLE)])
+        ws.merged_cells.add('A1:D1')
         
         # Store info
-        ws['A2'] = f"Type: {store_data['store_info'].get('type', 'N/A').title()}"
-        ws['A2'].font = Font(italic=True)
+        ws.append([self._cell(ws, f"Type: {store_data['store_info'].get('type', 'N/A').title()}",
+                              font=ITALIC_FONT)])
+        ws.append([])
         
-        # Column headers
-        row = 4
+        # Column headers, plus the shopping checklist column
         headers = ['Item', 'Amount', 'Unit', 'Used In (Recipes)']
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col_num)
-            cell.value = header
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.border = self.border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
+        header_row = self._cells(ws, headers, font=self.header_font, fill=self.header_fill,
+                                 border=self.border, alignment=CENTER_MIDDLE)
+        header_row.append(self._cell(ws, '✓ Got It', font=BOLD_FONT, fill=CHECKLIST_FILL,
+                                     border=self.border, alignment=CENTER))
+        ws.append(header_row)
         
         # Items
-        row += 1
         for item in store_data['items']:
-            ws.cell(row=row, column=1, value=item['item'].title())
-            ws.cell(row=row, column=2, value=str(item['amount']))
-            ws.cell(row=row, column=3, value=item['unit'])
-            
             # Format recipes list
             recipes = item.get('used_in', [])
             recipes_str = ', '.join(recipes[:2])  # First 2 recipes
             if len(recipes) > 2:
                 recipes_str += f" +{len(recipes)-2} more"
-            ws.cell(row=row, column=4, value=recipes_str)
-            
-            # Apply borders
-            for col in range(1, 5):
-                ws.cell(row=row, column=col).border = self.border
             
-            row += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 12
-        ws.column_dimensions['C'].width = 12
-        ws.column_dimensions['D'].width = 40
-        
-        # Add shopping checklist column
-        ws.cell(row=4, column=5, value='✓ Got It')
-        ws.cell(row=4, column=5).fill = PatternFill(start_color="FFD966", end_color="FFD966", fill_type="solid")
-        ws.cell(row=4, column=5).font = Font(bold=True)
-        ws.cell(row=4, column=5).border = self.border
-        ws.cell(row=4, column=5).alignment = Alignment(horizontal='center')
-        ws.column_dimensions['E'].width = 12
+            ws.append(self._cells(ws, (item['item'].title(), str(item['amount']), item['unit'], recipes_str),
+                                  border=self.border))
     
-    def _create_master_list_sheet(self, wb: Workbook, shopping_list: Dict) -> None:
+    def _create_master_list_sheet(self, wb: 'Workbook', rows: List[Tuple]) -> None:
         """Create a master list combining all stores"""
         ws = wb.create_sheet(title="Master List")
         
+        # Column widths (set before any rows - write-only sheet)
+        ws.column_dimensions['A'].width = 20
+        ws.column_dimensions['B'].width = 30
+        ws.column_dimensions['C'].width = 12
+        ws.column_dimensions['D'].width = 12
+        ws.column_dimensions['E'].width = 35
+        
         # Title
-        ws['A1'] = "Master Shopping List - All Stores"
-        ws['A1'].font = Font(bold=True, size=14)
-        ws.merge_cells('A1:E1')
-        ws['A1'].alignment = Alignment(horizontal='center')
+        ws.append([self._cell(ws, "Master Shopping List - All Stores", font=SHEET_TITLE_FONT,
+                              alignment=CENTER)])
+        ws.merged_cells.add('A1:E1')
+        ws.append([])
         
         # Headers
-        row = 3
         headers = ['Store', 'Item', 'Amount', 'Unit', 'Used In']
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col_num)
-            cell.value = header
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.border = self.border
+        ws.append(self._cells(ws, headers, font=self.header_font, fill=self.header_fill, border=self.border))
         
         # Aggregate all items
-        row += 1
-        for store_name, store_data in shopping_list['stores'].items():
-            for item in store_data['items']:
-                ws.cell(row=row, column=1, value=store_name.replace('_', ' ').title())
-                ws.cell(row=row, column=2, value=item['item'].title())
-                ws.cell(row=row, column=3, value=str(item['amount']))
-                ws.cell(row=row, column=4, value=item['unit'])
-                
-                recipes = item.get('used_in', [])
-                recipes_str = ', '.join(recipes[:2])
-                if len(recipes) > 2:
-                    recipes_str += f" +{len(recipes)-2} more"
-                ws.cell(row=row, column=5, value=recipes_str)
-                
-                # Apply borders
-                for col in range(1, 6):
-                    ws.cell(row=row, column=col).border = self.border
-                
-                row += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 20
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 12
-        ws.column_dimensions['D'].width = 12
-        ws.column_dimensions['E'].width = 35
+        for _, store_title, _, name, amount, unit, recipes_str in rows:
+            ws.append(self._cells(ws, (store_title, name.title(), str(amount), unit, recipes_str),
+                                  border=self.border))
     
-    def export_to_excel(self, shopping_list: Dict, output_dir: str = "output") -> str:
-        """Export shopping list to Excel file"""
-        Path(output_dir).mkdir(exist_ok=True)
+    def export_to_excel(self, shopping_list: Dict, output_dir: str = "output",
+                        rows: Optional[List[Tuple]] = None,
+                        stream: Optional[BinaryIO] = None) -> str:
+        """Export shopping list to Excel file (rows: pre-built _flatten output)
         
-        # Create workbook
-        wb = Workbook()
+        With a stream the workbook is written there instead of output_dir,
+        and the returned filename is only a suggested download name.
+        """
+        if rows is None:
+            rows = _flatten(shopping_list)
+        
+        # Create workbook - write-only: rows stream out instead of every
+        # cell staying in memory until save
+        wb = Workbook(write_only=True)
         
         # Create summary sheet
         self._create_summary_sheet(wb, shopping_list)
@@ -216,12 +227,18 @@ class ExcelExporter:
             self._create_store_sheet(wb, store_name, store_data)
         
         # Create master list
-        self._create_master_list_sheet(wb, shopping_list)
+        self._create_master_list_sheet(wb, rows)
         
         # Save file
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if stream is not None:
+            wb.save(stream)
+            return f"shopping_list_{timestamp}.xlsx"
+        
+        Path(output_dir).mkdir(exist_ok=True)
         filename = f"{output_dir}/shopping_list_{timestamp}.xlsx"
-        wb.save(filename)
+        with open(filename, 'wb', buffering=XLSX_BUFFER_SIZE) as f:
+            wb.save(f)
         
         return filename
 
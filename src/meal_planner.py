@@ -4,11 +4,36 @@ Meal Planning Engine
 Generates diverse 14-day meal plans with cultural variety
 """
 
+import re
 import yaml
+import json
 import random
+import pickle
+import hashlib
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any
 from datetime import datetime, timedelta
+from collections import deque
+
+# libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Parsed recipe files, pickled under a name derived from their mtimes
+RECIPE_CACHE_DIR = Path('.cache')
+
+# Ingredient substrings that mark a recipe's protein for variety checks
+_PROTEIN_KEYWORDS = ('chicken', 'turkey', 'salmon', 'fish', 'catfish',
+                     'barramundi', 'whiting', 'duck', 'lobster', 'crab')
+
+
+def _scan_proteins(recipe: Dict) -> frozenset:
+    """Protein keywords found in a recipe's ingredient names"""
+    items = [ing['item'].lower() for ing in recipe.get('ingredients') or []
+             if isinstance(ing, dict) and 'item' in ing]
+    return frozenset(p for p in _PROTEIN_KEYWORDS if any(p in item for item in items))
 
 
 class MealPlanner:
@@ -18,6 +43,20 @@ class MealPlanner:
         self.recipes = self._load_all_recipes()
         self.planning_days = self.config['system']['planning_cycle_days']
         
+        # Proteins per loaded recipe, keyed by id() - kept off the recipe
+        # dicts themselves since those are served as-is by the API. Holding
+        # the recipe alongside keeps its id from being reused.
+        self._recipe_proteins = {
+            id(recipe): (recipe, _scan_proteins(recipe))
+            for category in self.recipes.values() if isinstance(category, list)
+            for recipe in category if isinstance(recipe, dict)
+        }
+        # One alternation for all excluded ingredients (None: nothing excluded)
+        excluded = set(self.config['dietary_goals']['excluded_ingredients'])
+        self._excluded_re = re.compile(
+            '|'.join(re.escape(e.replace('_', ' ')) for e in excluded)
+        ) if excluded else None
+        
     def _load_config(self, config_path: str) -> Dict:
         """Load system configuration"""
         with open(config_path, 'r') as f:
@@ -33,17 +72,40 @@ class MealPlanner:
         }
         
         recipe_dir = Path('recipes')
-        for recipe_file in recipe_dir.glob('*.yaml'):
+        recipe_files = sorted(recipe_dir.glob('*.yaml'))
+        
+        # Any edit to a recipe file changes its mtime, and so the cache name
+        sig = tuple((p.name, p.stat().st_mtime_ns) for p in recipe_files)
+        digest = hashlib.blake2b(repr(sig).encode(), digest_size=8).hexdigest()
+        cache_path = RECIPE_CACHE_DIR / f"recipes_{digest}.pkl"
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        
+        for recipe_file in recipe_files:
             category = recipe_file.stem
             with open(recipe_file, 'r') as f:
-                recipes[category] = yaml.safe_load(f) or []
+                recipes[category] = yaml.load(f, Loader=SafeLoader) or []
+        
+        try:
+            RECIPE_CACHE_DIR.mkdir(exist_ok=True)
+            for stale in RECIPE_CACHE_DIR.glob('recipes_*.pkl'):
+                stale.unlink()
+            with open(cache_path, 'wb') as f:
+                pickle.dump(recipes, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # Read-only filesystem: parse YAML every time
         
         return recipes
     
     def _filter_recipes_by_proteins(self, recipes: List[Dict]) -> List[Dict]:
         """Filter recipes that only use allowed proteins"""
-        allowed_proteins = set(self.config['dietary_goals']['protein_sources'])
-        excluded = set(self.config['dietary_goals']['excluded_ingredients'])
+        excluded_re = self._excluded_re
+        if excluded_re is None:
+            return list(recipes)
         
         filtered = []
         for recipe in recipes:
@@ -53,10 +115,9 @@ class MealPlanner:
                 for ing in recipe['ingredients']:
                     if isinstance(ing, dict) and 'item' in ing:
                         item_lower = ing['item'].lower()
-                        for excluded_item in excluded:
-                            if excluded_item.replace('_', ' ') in item_lower:
-                                has_excluded = True
-                                break
+                        if excluded_re.search(item_lower):
+                            has_excluded = True
+                            break
             
             if not has_excluded:
                 filtered.append(recipe)
@@ -70,42 +131,33 @@ class MealPlanner:
             lookback_days = len(selected_recipes)
         
         recent = selected_recipes[-lookback_days:]
+        return bool(self._variety_filter([new_recipe], recent))
+    
+    def _variety_filter(self, candidates: List[Dict], recent: Iterable[Dict]) -> List[Dict]:
+        """Candidates that repeat no cuisine or protein from the recent window"""
+        # Window is built once, then each candidate is two set checks
+        recent_cuisines = {r.get('cuisine', '') for r in recent}
+        recent_proteins = set().union(*(self._extract_proteins(r) for r in recent))
         
-        # Check cuisine variety
-        recent_cuisines = [r.get('cuisine', '') for r in recent]
-        if new_recipe.get('cuisine', '') in recent_cuisines:
-            return False
-        
-        # Check protein variety (if applicable)
-        new_proteins = self._extract_proteins(new_recipe)
-        for recent_recipe in recent:
-            recent_proteins = self._extract_proteins(recent_recipe)
-            if new_proteins & recent_proteins:  # If there's overlap
-                return False
-        
-        return True
+        return [c for c in candidates
+                if c.get('cuisine', '') not in recent_cuisines
+                and recent_proteins.isdisjoint(self._extract_proteins(c))]
     
-    def _extract_proteins(self, recipe: Dict) -> set:
+    def _extract_proteins(self, recipe: Dict) -> frozenset:
         """Extract protein types from recipe"""
-        proteins = set()
-        protein_keywords = ['chicken', 'turkey', 'salmon', 'fish', 'catfish', 
-                          'barramundi', 'whiting', 'duck', 'lobster', 'crab']
-        
-        if 'ingredients' in recipe:
-            for ing in recipe['ingredients']:
-                if isinstance(ing, dict) and 'item' in ing:
-                    item_lower = ing['item'].lower()
-                    for protein in protein_keywords:
-                        if protein in item_lower:
-                            proteins.add(protein)
-        
-        return proteins
+        entry = self._recipe_proteins.get(id(recipe))
+        if entry is not None:
+            return entry[1]
+        return _scan_proteins(recipe)
     
-    def generate_meal_plan(self, start_date: datetime = None) -> Dict[str, Any]:
-        """Generate a 14-day meal plan with variety"""
+    def generate_meal_plan(self, start_date: datetime = None, seed: int = None) -> Dict[str, Any]:
+        """Generate a 14-day meal plan with variety (same seed -> same plan)"""
         if start_date is None:
             start_date = datetime.now()
         
+        # Plan-local generator: reproducible when seeded, no shared module state
+        choice = random.Random(seed).choice
+        
         meal_plan = {
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': (start_date + timedelta(days=self.planning_days - 1)).strftime('%Y-%m-%d'),
@@ -119,86 +171,98 @@ class MealPlanner:
         snacks = self.recipes['snacks']
         treats = self.recipes['sweet_treats']
         
-        selected_lunches = []
-        selected_dinners = []
+        # Snack pools don't change day to day - split them once
+        yogurt_snacks = tuple(s for s in snacks if 'Yogurt' in s.get('name', ''))
+        other_snacks = tuple(s for s in snacks if s.get('name') != 'Greek Yogurt Power Bowl')
+        snack_pm_pools = {}  # morning snack name -> afternoon candidates
+        
+        # Variety windows - only the last few picks are ever compared
+        recent_days = deque(maxlen=4)
+        recent_lunches = deque(maxlen=3)
+        recent_dinners = deque(maxlen=3)
+        
+        # Config lookups and calendar strings are the same every day
+        meal_structure = self.config['meal_structure']
+        times = {meal: meal_structure[meal]['timing']
+                 for meal in ('breakfast', 'snack_morning', 'lunch', 'snack_afternoon', 'dinner')}
+        people = self.config['system']['people']
+        dates = [start_date + timedelta(days=i) for i in range(self.planning_days)]
+        date_strs = [d.isoformat()[:10] for d in dates]
+        day_names = [d.strftime('%A') for d in dates]
         
         for day_num in range(self.planning_days):
-            current_date = start_date + timedelta(days=day_num)
-            day_name = current_date.strftime('%A')
             
             # Select breakfast (with variety)
-            breakfast_options = [b for b in breakfasts 
-                               if self._ensure_variety(meal_plan['days'], b, 4)]
+            breakfast_options = self._variety_filter(breakfasts, recent_days)
             if not breakfast_options:
                 breakfast_options = breakfasts
-            breakfast = random.choice(breakfast_options)
+            breakfast = choice(breakfast_options)
             
             # Select morning snack (alternate between different types)
-            snack_am_options = [s for s in snacks if s.get('name') != 'Greek Yogurt Power Bowl']
-            if day_num % 3 == 0:  # Yogurt every 3rd day
-                snack_am_options = [s for s in snacks if 'Yogurt' in s.get('name', '')]
-            snack_am = random.choice(snack_am_options) if snack_am_options else snacks[0]
+            snack_am_options = yogurt_snacks if day_num % 3 == 0 else other_snacks  # Yogurt every 3rd day
+            snack_am = choice(snack_am_options) if snack_am_options else snacks[0]
             
             # Select lunch (with variety)
-            lunch_options = [l for l in lunch_dinners 
-                           if self._ensure_variety(selected_lunches, l, 3)]
+            lunch_options = self._variety_filter(lunch_dinners, recent_lunches)
             if not lunch_options:
                 lunch_options = lunch_dinners
-            lunch = random.choice(lunch_options)
-            selected_lunches.append(lunch)
+            lunch = choice(lunch_options)
+            recent_lunches.append(lunch)
             
             # Select afternoon snack
-            snack_pm_options = [s for s in snacks 
-                              if s.get('name') != snack_am.get('name')]
-            snack_pm = random.choice(snack_pm_options)
+            snack_am_name = snack_am.get('name')
+            snack_pm_options = snack_pm_pools.get(snack_am_name)
+            if snack_pm_options is None:
+                snack_pm_options = snack_pm_pools[snack_am_name] = tuple(
+                    s for s in snacks if s.get('name') != snack_am_name)
+            snack_pm = choice(snack_pm_options)
             
             # Select dinner (with variety, and different from lunch)
-            dinner_options = [d for d in lunch_dinners 
-                            if d.get('name') != lunch.get('name') 
-                            and self._ensure_variety(selected_dinners, d, 3)]
+            dinner_options = [d for d in self._variety_filter(lunch_dinners, recent_dinners)
+                            if d.get('name') != lunch.get('name')]
             if not dinner_options:
                 dinner_options = [d for d in lunch_dinners 
                                 if d.get('name') != lunch.get('name')]
-            dinner = random.choice(dinner_options)
-            selected_dinners.append(dinner)
+            dinner = choice(dinner_options)
+            recent_dinners.append(dinner)
             
             # Occasionally add a sweet treat (2-3 times per week)
             treat = None
             if day_num % 3 == 0 or day_num % 5 == 0:
-                treat = random.choice(treats)
+                treat = choice(treats)
             
             day_meals = {
                 'day': day_num + 1,
-                'date': current_date.strftime('%Y-%m-%d'),
-                'day_name': day_name,
+                'date': date_strs[day_num],
+                'day_name': day_names[day_num],
                 'meals': {
                     'breakfast': {
-                        'time': self.config['meal_structure']['breakfast']['timing'],
+                        'time': times['breakfast'],
                         'recipe': breakfast['name'],
                         'cuisine': breakfast.get('cuisine', ''),
                         'servings': 1
                     },
                     'snack_morning': {
-                        'time': self.config['meal_structure']['snack_morning']['timing'],
+                        'time': times['snack_morning'],
                         'recipe': snack_am['name'],
                         'servings': 1
                     },
                     'lunch': {
-                        'time': self.config['meal_structure']['lunch']['timing'],
+                        'time': times['lunch'],
                         'recipe': lunch['name'],
                         'cuisine': lunch.get('cuisine', ''),
-                        'servings': self.config['system']['people']
+                        'servings': people
                     },
                     'snack_afternoon': {
-                        'time': self.config['meal_structure']['snack_afternoon']['timing'],
+                        'time': times['snack_afternoon'],
                         'recipe': snack_pm['name'],
                         'servings': 1
                     },
                     'dinner': {
-                        'time': self.config['meal_structure']['dinner']['timing'],
+                        'time': times['dinner'],
                         'recipe': dinner['name'],
                         'cuisine': dinner.get('cuisine', ''),
-                        'servings': self.config['system']['people']
+                        'servings': people
                     }
                 }
             }
@@ -211,18 +275,23 @@ class MealPlanner:
                 }
             
             meal_plan['days'].append(day_meals)
+            recent_days.append(day_meals)
         
         return meal_plan
     
-    def save_meal_plan(self, meal_plan: Dict, output_dir: str = "output") -> str:
-        """Save meal plan to YAML file"""
+    def save_meal_plan(self, meal_plan: Dict, output_dir: str = "output",
+                       extension: str = "yaml") -> str:
+        """Save meal plan to a YAML file, or JSON when extension is 'json'"""
         Path(output_dir).mkdir(exist_ok=True)
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{output_dir}/meal_plan_{timestamp}.yaml"
+        filename = f"{output_dir}/meal_plan_{timestamp}.{extension}"
         
         with open(filename, 'w') as f:
-            yaml.dump(meal_plan, f, default_flow_style=False, sort_keys=False)
+            if extension == 'json':
+                json.dump(meal_plan, f, indent=2, default=str)
+            else:
+                yaml.dump(meal_plan, f, Dumper=SafeDumper, default_flow_style=False, sort_keys=False)
         
         return filename
 
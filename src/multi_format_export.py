@@ -4,8 +4,74 @@ Multiple lightweight export options
 """
 
 import csv
-from typing import Dict, List
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
 from io import StringIO
+from functools import lru_cache
+from itertools import chain, groupby, repeat
+
+# Optional: faster JSON for API responses
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+@lru_cache(maxsize=256)
+def _pretty_store(store_name: str) -> str:
+    """Display name for a store key, e.g. 'whole_foods' -> 'Whole Foods'"""
+    return store_name.replace('_', ' ').title()
+
+
+def _flatten(shopping_list: Dict) -> List[Tuple]:
+    """Flatten a shopping list into one row per item, in store order.
+
+    Rows are (store_name, store_title, index_in_store, item, amount, unit,
+    recipes_str) so every exporter walks the nested stores/items once.
+    """
+    rows = []
+    for store_name, store_data in shopping_list.get('stores', {}).items():
+        store_title = _pretty_store(store_name)
+        for i, item in enumerate(store_data.get('items', [])):
+            recipes = item.get('used_in', [])
+            recipes_str = ', '.join(recipes[:2])  # First 2 recipes
+            if len(recipes) > 2:
+                recipes_str += f" +{len(recipes)-2} more"
+            rows.append((store_name, store_title, i, item.get('item', ''),
+                         item.get('amount', ''), item.get('unit', ''), recipes_str))
+    return rows
+
+
+def _json_dumps_bytes(obj) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+# "• name - amount unit" line for SMS lists, bound once
+_sms_item = "• {} - {} {}".format
+
+
+def _iter_csv_rows(rows: List[Tuple], include_prices: bool = False,
+                   cost_data: Dict = None) -> Iterator[Tuple]:
+    """CSV header, then one record per _flatten row"""
+    if include_prices and cost_data:
+        yield ('Store', 'Item', 'Amount', 'Unit', 'Cost')
+        
+        cost_stores = cost_data.get('stores', {})
+        for store_name, store_rows in groupby(rows, key=lambda row: row[0]):
+            store_cost_items = cost_stores.get(store_name, {}).get('items_with_costs', [])
+            # Items past the end of the cost list get no cost
+            for row, cost_info in zip(store_rows, chain(store_cost_items, repeat({}))):
+                cost = cost_info.get('cost', '')
+                cost_str = f"${cost:.2f}" if cost else ""
+                yield (row[1], row[3], row[4], row[5], cost_str)
+    else:
+        yield ('Store', 'Item', 'Amount', 'Unit')
+        for _, store_title, _, name, amount, unit, _ in rows:
+            yield (store_title, name, amount, unit)
 
 
 class CSVExporter:
@@ -13,51 +79,28 @@ class CSVExporter:
     
     @staticmethod
     def export_shopping_list(shopping_list: Dict, include_prices: bool = False, 
-                            cost_data: Dict = None) -> str:
-        """Export shopping list to CSV string"""
+                            cost_data: Dict = None, rows: Optional[List[Tuple]] = None) -> str:
+        """Export shopping list to CSV string (rows: pre-built _flatten output)"""
+        
+        if rows is None:
+            rows = _flatten(shopping_list)
         
         output = StringIO()
+        csv.writer(output).writerows(_iter_csv_rows(rows, include_prices, cost_data))
+        return output.getvalue()
+    
+    @staticmethod
+    def write_shopping_list(shopping_list: Dict, output_path: str, buffering: int = 1 << 20,
+                            include_prices: bool = False, cost_data: Dict = None,
+                            rows: Optional[List[Tuple]] = None) -> str:
+        """Write shopping list CSV straight to a file, without building the string first"""
         
-        if include_prices and cost_data:
-            writer = csv.writer(output)
-            writer.writerow(['Store', 'Item', 'Amount', 'Unit', 'Cost'])
-            
-            stores = shopping_list.get('stores', {})
-            
-            for store_name, store_data in stores.items():
-                items = store_data.get('items', [])
-                store_cost_items = cost_data.get('stores', {}).get(store_name, {}).get('items_with_costs', [])
-                
-                for i, item in enumerate(items):
-                    cost_info = store_cost_items[i] if i < len(store_cost_items) else {}
-                    cost = cost_info.get('cost', '')
-                    cost_str = f"${cost:.2f}" if cost else ""
-                    
-                    writer.writerow([
-                        store_name.replace('_', ' ').title(),
-                        item.get('item', ''),
-                        item.get('amount', ''),
-                        item.get('unit', ''),
-                        cost_str
-                    ])
-        else:
-            writer = csv.writer(output)
-            writer.writerow(['Store', 'Item', 'Amount', 'Unit'])
-            
-            stores = shopping_list.get('stores', {})
-            
-            for store_name, store_data in stores.items():
-                items = store_data.get('items', [])
-                
-                for item in items:
-                    writer.writerow([
-                        store_name.replace('_', ' ').title(),
-                        item.get('item', ''),
-                        item.get('amount', ''),
-                        item.get('unit', '')
-                    ])
+        if rows is None:
+            rows = _flatten(shopping_list)
         
-        return output.getvalue()
+        with open(output_path, 'w', newline='', buffering=buffering, encoding='utf-8') as f:
+            csv.writer(f).writerows(_iter_csv_rows(rows, include_prices, cost_data))
+        return output_path
     
     @staticmethod
     def save_to_file(csv_string: str, output_path: str) -> str:
@@ -91,7 +134,7 @@ class SMSFormatter:
         stores = shopping_list.get('stores', {})
         
         for store_name, store_data in stores.items():
-            store_title = store_name.replace('_', ' ').title()
+            store_title = _pretty_store(store_name)
             
             if include_prices and cost_data:
                 store_total = cost_data.get('stores', {}).get(store_name, {}).get('total', 0)
@@ -108,14 +151,16 @@ class SMSFormatter:
                     cost_info = store_cost_items[i] if i < len(store_cost_items) else {}
                     cost = cost_info.get('cost')
                     
-                    item_line = f"• {item.get('item', '')} - {item.get('amount', '')} {item.get('unit', '')}"
+                    item_line = _sms_item(item.get('item', ''), item.get('amount', ''), item.get('unit', ''))
                     if cost:
                         item_line += f" (${cost:.2f})"
                     
                     lines.append(item_line)
             else:
-                for item in items:
-                    lines.append(f"• {item.get('item', '')} - {item.get('amount', '')} {item.get('unit', '')}")
+                lines.extend([
+                    _sms_item(item.get('item', ''), item.get('amount', ''), item.get('unit', ''))
+                    for item in items
+                ])
             
             lines.append("")
         
@@ -174,7 +219,7 @@ class JSONFormatter:
         for store_name, store_data in stores.items():
             store_obj = {
                 'name': store_name,
-                'display_name': store_name.replace('_', ' ').title(),
+                'display_name': _pretty_store(store_name),
                 'items': []
             }
             
@@ -204,18 +249,26 @@ class JSONFormatter:
                     
                     store_obj['items'].append(item_obj)
             else:
-                for i, item in enumerate(items):
-                    store_obj['items'].append({
+                store_obj['items'] = [
+                    {
                         'id': i,
                         'name': item.get('item', ''),
                         'amount': item.get('amount', ''),
                         'unit': item.get('unit', ''),
                         'checked': False
-                    })
+                    }
+                    for i, item in enumerate(items)
+                ]
             
             result['stores'].append(store_obj)
         
         return result
+    
+    @classmethod
+    def format_shopping_list_bytes(cls, shopping_list: Dict, include_prices: bool = False,
+                                   cost_data: Dict = None) -> bytes:
+        """Shopping list API response, serialized to JSON bytes"""
+        return _json_dumps_bytes(cls.format_shopping_list(shopping_list, include_prices, cost_data))
 
 
 if __name__ == "__main__":
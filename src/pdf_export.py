@@ -12,6 +12,8 @@ from reportlab.lib.enums import TA_LEFT, TA_CENTER
 from datetime import datetime
 from pathlib import Path
 
+from multi_format_export import _pretty_store
+
 
 class PDFExporter:
     """Export shopping lists and recipes to PDF"""
@@ -90,7 +92,7 @@ class PDFExporter:
         
         for store_name, store_data in stores.items():
             # Store header
-            store_title = store_name.replace('_', ' ').title()
+            store_title = _pretty_store(store_name)
             
             if include_prices and cost_data:
                 store_cost_data = cost_data.get('stores', {}).get(store_name, {})